@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from recipes.models import RecipeIngredients, Recipes, Tags
+
+        from .response_cache import invalidate_recipe_lists
+
+        # Теги и ингредиенты рецепта меняются вместе с сохранением
+        # или удалением самого рецепта, поэтому без m2m_changed и удаления
+        # RecipeIngredients: с обработчиками Django не может изменить их
+        # без дополнительных запросов
+        for model in (Recipes, Tags, RecipeIngredients):
+            post_save.connect(invalidate_recipe_lists, sender=model)
+        for model in (Recipes, Tags):
+            post_delete.connect(invalidate_recipe_lists, sender=model)
@@ -0,0 +1,31 @@
+from django.urls import path
+
+from .async_views import (DETAIL_ACTIONS, LIST_ACTIONS, async_read,
+                          ingredient_detail, ingredient_list, recipe_detail,
+                          recipe_list, tag_detail, tag_list)
+from .views import IngredientsViewSet, RecipesViewSet, TagViewSet
+
+ROUTES = (
+    ('tags', TagViewSet, tag_list, tag_detail),
+    ('ingredients', IngredientsViewSet, ingredient_list, ingredient_detail),
+    ('recipes', RecipesViewSet, recipe_list, recipe_detail),
+)
+
+urlpatterns = []
+for prefix, viewset, list_view, detail_view in ROUTES:
+    urlpatterns += [
+        path(
+            f'{prefix}/',
+            async_read(
+                list_view, viewset, LIST_ACTIONS,
+                basename=prefix, detail=False,
+            ),
+        ),
+        path(
+            f'{prefix}/<int:pk>/',
+            async_read(
+                detail_view, viewset, DETAIL_ACTIONS,
+                basename=prefix, detail=True,
+            ),
+        ),
+    ]
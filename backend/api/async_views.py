@@ -0,0 +1,330 @@
+import asyncio
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page
+from django.db import close_old_connections
+from django.db.models import Exists, F, OuterRef, Value
+from django.http import HttpResponse, HttpResponseNotModified
+from recipes.models import RecipeIngredients, Recipes, Tags
+from recipes.search import autocomplete_ingredients
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       NotAuthenticated, NotFound,
+                                       ValidationError)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from social.models import FavoritesList, FollowsList, ShoppingList
+from users.models import User
+
+from .filters import RecipesFilter
+from .pagination import Pagination
+from .response_cache import recipe_list_cache
+from .serializers import RecipeReadSerializer
+from .views import IngredientsViewSet, TagViewSet
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}
+
+
+def in_thread(function):
+    """
+    Синхронная функция с обращениями к базе для вызова из корутины.
+    Вызовы выполняются в пуле потоков и идут параллельно, соединение
+    потока закрывается по CONN_MAX_AGE, как в конце обычного запроса.
+    """
+    @wraps(function)
+    def run(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        content_type='application/json',
+        status=status,
+    )
+
+
+def error_response(request, error):
+    """Ответ с ошибкой в том же виде, что у обработчика исключений DRF"""
+    detail = error.detail
+    if not isinstance(detail, (list, dict)):
+        detail = {'detail': detail}
+    response = json_response(detail, error.status_code)
+    if isinstance(error, (NotAuthenticated, AuthenticationFailed)):
+        authenticator = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+        header = authenticator.authenticate_header(request)
+        if header:
+            response['WWW-Authenticate'] = header
+        else:
+            response.status_code = 403
+    return response
+
+
+def is_supported(request):
+    """
+    Асинхронный путь отдает только JSON и страницы по номеру.
+    Курсор, page=last, format и браузерный API обрабатывает вьюсет.
+    """
+    return (
+        not {'cursor', 'format'} & request.GET.keys()
+        and request.GET.get('page') != 'last'
+        and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+    )
+
+
+def async_read(handler, viewset, actions, **initkwargs):
+    """
+    Представление для ASGI: GET и HEAD обрабатывает корутина handler,
+    остальные методы и неподдерживаемые запросы - синхронный вьюсет.
+    """
+    sync_view = sync_to_async(viewset.as_view(
+        {
+            method: action for method, action in actions.items()
+            if hasattr(viewset, action)
+        },
+        **initkwargs,
+    ))
+
+    @wraps(handler)
+    async def view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not is_supported(request):
+            return await sync_view(request, *args, **kwargs)
+        try:
+            return await handler(request, *args, **kwargs)
+        except APIException as error:
+            return error_response(request, error)
+    # CSRF для сессий проверяет SessionAuthentication, как во вьюсетах
+    view.csrf_exempt = True
+    return view
+
+
+async def authenticate(request):
+    """Запрос DRF с пользователем по классам аутентификации DRF"""
+    api_request = Request(request, authenticators=[
+        authenticator()
+        for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    await in_thread(lambda: api_request.user)()
+    return api_request
+
+
+@in_thread
+def filter_recipes(request):
+    """Рецепты по фильтрам RecipesFilter, как в DjangoFilterBackend"""
+    filterset = RecipesFilter(
+        request.query_params, queryset=Recipes.objects.all(), request=request
+    )
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+@in_thread
+def count_recipes(queryset, page_size):
+    return Pagination.django_paginator_class(queryset, page_size).count
+
+
+@in_thread
+def page_ids(queryset, offset, limit):
+    return list(queryset.values_list('id', flat=True)[offset:offset + limit])
+
+
+@in_thread
+def fetch_recipes(ids):
+    return Recipes.objects.in_bulk(ids)
+
+
+@in_thread
+def fetch_tags(ids):
+    tags = defaultdict(list)
+    for tag in Tags.objects.filter(recipes__in=ids).annotate(
+        recipe_id=F('recipes')
+    ):
+        tags[tag.recipe_id].append(tag)
+    return tags
+
+
+@in_thread
+def fetch_ingredients(ids):
+    ingredients = defaultdict(list)
+    for ingredient in RecipeIngredients.objects.filter(
+        recipe_id__in=ids
+    ).select_related('ingredient'):
+        ingredients[ingredient.recipe_id].append(ingredient)
+    return ingredients
+
+
+@in_thread
+def fetch_authors(ids, user):
+    if user.is_anonymous:
+        is_subscribed = Value(False)
+    else:
+        is_subscribed = Exists(FollowsList.objects.filter(
+            user=user, author=OuterRef('pk')
+        ))
+    return User.objects.filter(recipes__in=ids).annotate(
+        is_subscribed=is_subscribed
+    ).distinct().in_bulk()
+
+
+@in_thread
+def fetch_marked(model, user, ids):
+    return frozenset(model.objects.filter(
+        user=user, recipe_id__in=ids
+    ).values_list('recipe_id', flat=True))
+
+
+def set_prefetched(instance, name, objects):
+    """Связанные объекты в кэше prefetch_related, как после Prefetch"""
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = objects
+    queryset._prefetch_done = True
+    instance._prefetched_objects_cache[name] = queryset
+
+
+async def load_recipes(ids, user):
+    """
+    Рецепты с id из ids в том же порядке. Рецепты, теги, ингредиенты,
+    авторы и отметки пользователя загружаются параллельно.
+    """
+    if not ids:
+        return []
+    queries = [
+        fetch_recipes(ids),
+        fetch_tags(ids),
+        fetch_ingredients(ids),
+        fetch_authors(ids, user),
+    ]
+    if user.is_authenticated:
+        queries += [
+            fetch_marked(FavoritesList, user, ids),
+            fetch_marked(ShoppingList, user, ids),
+        ]
+    recipes, tags, ingredients, authors, *marked = await asyncio.gather(
+        *queries
+    )
+    favorites, shopping = marked or (frozenset(), frozenset())
+    result = []
+    for recipe_id in ids:
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            continue
+        recipe.author = authors[recipe.author_id]
+        recipe._prefetched_objects_cache = {}
+        set_prefetched(recipe, 'tags', tags[recipe_id])
+        set_prefetched(recipe, 'recipe_recipe', ingredients[recipe_id])
+        recipe.is_favorited = recipe_id in favorites
+        recipe.is_in_shopping_cart = recipe_id in shopping
+        result.append(recipe)
+    return result
+
+
+def page_number(request):
+    number = request.query_params.get(Pagination.page_query_param, '1')
+    if not number.isdigit() or int(number) < 1:
+        raise NotFound(Pagination.invalid_page_message)
+    return int(number)
+
+
+async def recipe_list(request):
+    request = await authenticate(request)
+    return await recipe_list_cache.arespond(
+        request, lambda: recipe_list_page(request)
+    )
+
+
+async def recipe_list_page(request):
+    """
+    Список рецептов: число записей и id страницы, затем рецепты
+    со связями запрашиваются параллельно.
+    """
+    pagination = Pagination()
+    page_size = pagination.get_page_size(request)
+    number = page_number(request)
+    queryset = await filter_recipes(request)
+    count, ids = await asyncio.gather(
+        count_recipes(queryset, page_size),
+        page_ids(queryset, (number - 1) * page_size, page_size),
+    )
+    if not ids and number > 1:
+        raise NotFound(Pagination.invalid_page_message)
+    recipes = await load_recipes(ids, request.user)
+    paginator = pagination.django_paginator_class((), page_size)
+    paginator.count = count
+    pagination.page = Page(recipes, number, paginator)
+    pagination.request = request
+    serializer = RecipeReadSerializer(
+        recipes, many=True, context={'request': request}
+    )
+    return json_response(
+        pagination.get_paginated_response(serializer.data).data
+    )
+
+
+async def recipe_detail(request, pk):
+    request = await authenticate(request)
+    recipes = await load_recipes([pk], request.user)
+    if not recipes:
+        raise NotFound()
+    serializer = RecipeReadSerializer(
+        recipes[0], context={'request': request}
+    )
+    return json_response(serializer.data)
+
+
+@in_thread
+def catalog_response(viewset, request, pk=None, search=None):
+    """
+    Ответ справочника по правилам CatalogCacheMixin: 304 по ETag,
+    готовый JSON полного списка, подсказки по name и запись по id.
+    Справочники не зависят от пользователя, поэтому без аутентификации.
+    """
+    view = viewset()
+    etag = view.get_catalog_etag(request)
+    if view.is_not_modified(request, etag):
+        return view.set_catalog_headers(HttpResponseNotModified(), etag)
+    name = request.GET.get('name')
+    if pk is not None:
+        instance = viewset.queryset.filter(pk=pk).first()
+        if instance is None:
+            raise NotFound()
+        response = json_response(viewset.serializer_class(instance).data)
+    elif search is not None and name:
+        response = json_response(
+            viewset.serializer_class(
+                search(name, view.catalog_version()), many=True
+            ).data
+        )
+    else:
+        response = view.serialized_list(request)
+    return view.set_catalog_headers(response, etag)
+
+
+async def tag_list(request):
+    return await catalog_response(TagViewSet, request)
+
+
+async def tag_detail(request, pk):
+    return await catalog_response(TagViewSet, request, pk=pk)
+
+
+async def ingredient_list(request):
+    return await catalog_response(
+        IngredientsViewSet, request, search=autocomplete_ingredients
+    )
+
+
+async def ingredient_detail(request, pk):
+    return await catalog_response(IngredientsViewSet, request, pk=pk)
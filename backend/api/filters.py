@@ -1,17 +1,8 @@
 from django_filters.rest_framework import FilterSet, filters
-from recipes.models import Ingredients, Recipes, Tags
-from rest_framework.filters import SearchFilter
+from recipes.models import Recipes, Tags
+from recipes.search import search_recipes
 
-
-class IngredientsFilter(SearchFilter):
-    """Фильтр ингредиентов"""
-    search_param = 'name'
-
-    class Meta:
-        model = Ingredients
-        fields = (
-            'name',
-        )
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
 
 
 class RecipesFilter(FilterSet):
@@ -26,6 +17,15 @@ class RecipesFilter(FilterSet):
     is_in_shopping_cart = filters.NumberFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'По популярности'),
+        ),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipes
@@ -34,6 +34,8 @@ class RecipesFilter(FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
+            'ordering',
         )
 
     def filter_is_favorited(self, queryset, title, value):
@@ -49,3 +51,11 @@ class RecipesFilter(FilterSet):
                 shopping__user=self.request.user
             )
         return queryset
+
+    def filter_search(self, queryset, title, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, title, value):
+        if value == 'popular':
+            return queryset.order_by(*POPULAR_ORDERING)
+        return queryset
@@ -0,0 +1,429 @@
+import base64
+import io
+import json
+import math
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict, namedtuple
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from foodgram.metrics import QueryCounter, count_queries
+from PIL import Image
+from recipes.images import get_thread_pool
+from recipes.models import Ingredients, RecipeIngredients, Recipes, Tags
+from rest_framework.test import APIClient
+from social.models import FavoritesList, FollowsList, ShoppingList, Timeline
+from users.models import User
+
+PASSWORD = 'benchmark-password'
+MIN_REGRESSION_MS = 1.0
+MAX_INGREDIENTS = 10
+
+Case = namedtuple(
+    'Case',
+    ('name', 'method', 'path', 'budget', 'auth', 'data', 'before', 'after',
+     'group'),
+    defaults=(True, None, None, None, None),
+)
+
+
+def image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), 'orange').save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+def recipe_data(context):
+    return {
+        'name': 'benchmark',
+        'text': 'benchmark',
+        'cooking_time': 10,
+        'image': context['image'],
+        'tags': [context['tag_id']],
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 2}
+            for ingredient_id in context['ingredient_ids']
+        ],
+    }
+
+
+def user_data(context):
+    return {
+        'email': f'new{context["iteration"]}@benchmark.ru',
+        'username': f'new{context["iteration"]}',
+        'first_name': 'new',
+        'last_name': 'new',
+        'password': PASSWORD,
+    }
+
+
+CASES = (
+    Case('users', 'get', '/api/users/', 3),
+    Case('users-detail', 'get', '/api/users/{author}/', 2),
+    Case('users-me', 'get', '/api/users/me/', 1),
+    Case('users-create', 'post', '/api/users/', 4, auth=False,
+         data=user_data),
+    Case('users-subscriptions', 'get',
+         '/api/users/subscriptions/?recipes_limit=3', 3),
+    Case('users-subscribe', 'post', '/api/users/{author}/subscribe/', 14,
+         after=('delete', '/api/users/{author}/subscribe/')),
+    Case('users-unsubscribe', 'delete', '/api/users/{author}/subscribe/', 7,
+         before=('post', '/api/users/{author}/subscribe/')),
+    Case('auth-token-login', 'post', '/api/auth/token/login/', 3,
+         auth=False,
+         data=lambda context: {
+             'email': context['email'], 'password': PASSWORD
+         }),
+    Case('tags', 'get', '/api/tags/', 1, auth=False),
+    Case('tags-detail', 'get', '/api/tags/{tag_id}/', 2, auth=False),
+    Case('ingredients', 'get', '/api/ingredients/', 1, auth=False),
+    Case('ingredients-search', 'get', '/api/ingredients/?name={prefix}', 1,
+         auth=False),
+    Case('ingredients-detail', 'get', '/api/ingredients/{ingredient}/', 2,
+         auth=False),
+    Case('recipes-anonymous-6', 'get', '/api/recipes/?limit=6', 4,
+         auth=False, group='recipes-anonymous'),
+    Case('recipes-anonymous-24', 'get', '/api/recipes/?limit=24', 4,
+         auth=False, group='recipes-anonymous'),
+    Case('recipes-anonymous-96', 'get', '/api/recipes/?limit=96', 4,
+         auth=False, group='recipes-anonymous'),
+    Case('recipes-6', 'get', '/api/recipes/?limit=6', 5, group='recipes'),
+    Case('recipes-24', 'get', '/api/recipes/?limit=24', 5, group='recipes'),
+    Case('recipes-96', 'get', '/api/recipes/?limit=96', 5, group='recipes'),
+    Case('recipes-cursor', 'get', '/api/recipes/?cursor=&limit=24', 4),
+    Case('recipes-filtered', 'get',
+         '/api/recipes/?tags={tag}&is_favorited=1', 6),
+    Case('recipes-popular', 'get', '/api/recipes/?ordering=popular', 5),
+    Case('recipes-search', 'get', '/api/recipes/?search={word}', 6),
+    Case('recipes-detail', 'get', '/api/recipes/{recipe}/', 4),
+    Case('recipes-feed', 'get', '/api/recipes/feed/', 5),
+    Case('recipes-pantry', 'get', '/api/recipes/pantry/?ingredients={pantry}',
+         4, auth=False),
+    Case('recipes-download', 'get', '/api/recipes/download_shopping_cart/',
+         1),
+    Case('recipes-create', 'post', '/api/recipes/', 30, data=recipe_data,
+         after=('delete', '/api/recipes/{created}/')),
+    Case('recipes-update', 'patch', '/api/recipes/{own_recipe}/', 26,
+         data=recipe_data),
+    Case('recipes-delete', 'delete', '/api/recipes/{created}/', 17,
+         before=('post', '/api/recipes/', recipe_data)),
+    Case('recipes-favorite', 'post', '/api/recipes/{recipe}/favorite/', 6,
+         after=('delete', '/api/recipes/{recipe}/favorite/')),
+    Case('recipes-unfavorite', 'delete', '/api/recipes/{recipe}/favorite/',
+         5, before=('post', '/api/recipes/{recipe}/favorite/')),
+    Case('recipes-shopping-cart', 'post',
+         '/api/recipes/{recipe}/shopping_cart/', 16,
+         after=('delete', '/api/recipes/{recipe}/shopping_cart/')),
+    Case('recipes-shopping-cart-delete', 'delete',
+         '/api/recipes/{recipe}/shopping_cart/', 10,
+         before=('post', '/api/recipes/{recipe}/shopping_cart/')),
+)
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        ' Время ответа и число SQL-запросов эндпоинтов API на синтетических '
+        'данных во временной базе. Завершается с ошибкой при превышении '
+        'бюджета запросов или замедлении относительно сохраненных значений '
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=300)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Число измерений каждого эндпоинта',
+        )
+        parser.add_argument(
+            '--case',
+            nargs='+',
+            help='Измерить только эти эндпоинты',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON с прежними результатами для сравнения',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            help='Сохранить результаты в JSON',
+        )
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            default=0.25,
+            help='Допустимое замедление медианы относительно baseline',
+        )
+
+    def handle(self, *args, **options):
+        cases = [
+            case for case in CASES
+            if not options['case'] or case.name in options['case']
+        ]
+        if not cases:
+            raise CommandError('Нет эндпоинтов для измерения')
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        media_root = tempfile.mkdtemp()
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, serialized_aliases=set()
+        )
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                context = self.seed(options)
+                results = self.run(cases, context, options['repeat'])
+                get_thread_pool().shutdown(wait=True)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.report(cases, results)
+        failures = self.check_budgets(cases, results)
+        if options['baseline']:
+            failures += self.compare(cases, results, options)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f'Проверок не пройдено: {len(failures)}')
+        self.stdout.write(self.style.SUCCESS('Все проверки пройдены'))
+
+    def seed(self, options):
+        """Синтетические данные и значения для путей эндпоинтов"""
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        password = User(username='hash')
+        password.set_password(PASSWORD)
+        User.objects.bulk_create([
+            User(
+                username=f'user{number}',
+                email=f'user{number}@benchmark.ru',
+                first_name='user',
+                last_name=str(number),
+                password=password.password,
+            )
+            for number in range(max(options['users'], 3))
+        ])
+        users = list(User.objects.order_by('id'))
+        Tags.objects.bulk_create([
+            Tags(name=f'tag{number}', color=f'#0000{number:02d}',
+                 slug=f'tag{number}')
+            for number in range(5)
+        ])
+        tags = list(Tags.objects.order_by('id'))
+        Ingredients.objects.bulk_create([
+            Ingredients(name=f'ingredient {number}', measurement_unit='г')
+            for number in range(max(options['ingredients'], 10))
+        ])
+        ingredients = list(Ingredients.objects.order_by('id'))
+        Recipes.objects.bulk_create([
+            Recipes(
+                author=users[0] if number == 0 else rng.choice(users),
+                name=f'recipe {number}',
+                text=f'benchmark recipe {number}',
+                cooking_time=rng.randint(1, 120),
+                image='recipes/benchmark.png',
+            )
+            for number in range(max(options['recipes'], 10))
+        ])
+        recipes = list(Recipes.objects.order_by('id'))
+        Recipes.tags.through.objects.bulk_create([
+            Recipes.tags.through(recipes_id=recipe.id, tags_id=tag.id)
+            for recipe in recipes
+            for tag in rng.sample(tags, rng.randint(1, 3))
+        ])
+        RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(recipe=recipe, ingredient=ingredient,
+                              amount=rng.randint(1, 500))
+            for recipe in recipes
+            for ingredient in rng.sample(
+                ingredients,
+                MAX_INGREDIENTS if recipe is recipes[-1]
+                else rng.randint(3, MAX_INGREDIENTS),
+            )
+        ])
+        user, author = users[0], users[1]
+        follows = {
+            (follower.id, followed.id)
+            for follower in users
+            for followed in rng.sample(users, min(10, len(users)))
+            if follower != followed and (follower, followed) != (user, author)
+        }
+        FollowsList.objects.bulk_create([
+            FollowsList(user_id=user_id, author_id=author_id)
+            for user_id, author_id in follows
+        ])
+        by_author = defaultdict(list)
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe.id)
+        Timeline.objects.bulk_create([
+            Timeline(user_id=user_id, recipe_id=recipe_id)
+            for user_id, author_id in follows
+            for recipe_id in by_author[author_id]
+        ])
+        free = recipes[-1]
+        for model in (FavoritesList, ShoppingList):
+            model.objects.bulk_create([
+                model(user=follower, recipe=recipe)
+                for follower in users
+                for recipe in rng.sample(recipes[:-1], 10)
+            ])
+        quiet = io.StringIO()
+        call_command('rebuild_shopping_totals', stdout=quiet)
+        call_command('reconcile_counters', stdout=quiet)
+        call_command('rebuild_search_index', stdout=quiet)
+        self.stdout.write(
+            f'Данные: {len(users)} пользователей, {len(recipes)} рецептов, '
+            f'{len(ingredients)} ингредиентов за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+        return {
+            'user': user,
+            'email': user.email,
+            'author': author.id,
+            'recipe': free.id,
+            'own_recipe': recipes[0].id,
+            'tag': tags[0].slug,
+            'tag_id': tags[0].id,
+            'ingredient': ingredients[0].id,
+            'ingredient_ids': [item.id for item in ingredients[:5]],
+            'pantry': ','.join(str(item.id) for item in ingredients[:10]),
+            'prefix': 'ingredient 1',
+            'word': 'recipe',
+            'image': image(),
+            'created': None,
+            'iteration': 0,
+        }
+
+    def request(self, client, method, path, data, context):
+        if callable(data):
+            data = data(context)
+        response = getattr(client, method)(
+            path.format(**context), data, format='json'
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elif response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path.format(**context)}: '
+                f'{response.status_code} {response.content[:200]}'
+            )
+        if method == 'post' and isinstance(response.data, dict):
+            context['created'] = response.data.get('id')
+        return response
+
+    @staticmethod
+    def step(step):
+        """Вспомогательный запрос до или после измеряемого"""
+        method, path, *data = step
+        return method, path, data[0] if data else None
+
+    def run(self, cases, context, repeat):
+        clients = {False: APIClient(), True: APIClient()}
+        clients[True].force_authenticate(context['user'])
+        results = {}
+        for case in cases:
+            client = clients[case.auth]
+            timings, queries = [], []
+            for iteration in range(repeat + 1):
+                context['iteration'] += 1
+                if case.before:
+                    self.request(client, *self.step(case.before), context)
+                counter = QueryCounter()
+                started = time.perf_counter()
+                with count_queries(counter):
+                    self.request(client, case.method, case.path, case.data,
+                                 context)
+                elapsed = time.perf_counter() - started
+                if case.after:
+                    self.request(client, *self.step(case.after), context)
+                if iteration:
+                    timings.append(elapsed * 1000)
+                    queries.append(counter.queries)
+            results[case.name] = {
+                'p50': round(percentile(timings, 0.5), 3),
+                'p95': round(percentile(timings, 0.95), 3),
+                'p99': round(percentile(timings, 0.99), 3),
+                'queries': max(queries),
+            }
+        return results
+
+    def report(self, cases, results):
+        self.stdout.write(
+            f'{"эндпоинт":<30} {"p50, мс":>8} {"p95, мс":>8} '
+            f'{"p99, мс":>8} {"запросы":>8} {"бюджет":>7}'
+        )
+        for case in cases:
+            result = results[case.name]
+            self.stdout.write(
+                f'{case.name:<30} {result["p50"]:>8.2f} '
+                f'{result["p95"]:>8.2f} {result["p99"]:>8.2f} '
+                f'{result["queries"]:>8} {case.budget:>7}'
+            )
+
+    def check_budgets(self, cases, results):
+        """Бюджеты запросов и постоянство числа запросов в группах"""
+        failures = []
+        groups = defaultdict(set)
+        for case in cases:
+            result = results[case.name]
+            if result['queries'] > case.budget:
+                failures.append(
+                    f'{case.name}: {result["queries"]} SQL-запросов '
+                    f'при бюджете {case.budget}'
+                )
+            if case.group:
+                groups[case.group].add(result['queries'])
+        for group, counts in groups.items():
+            if len(counts) > 1:
+                failures.append(
+                    f'{group}: число запросов зависит от размера страницы '
+                    f'({sorted(counts)})'
+                )
+        return failures
+
+    def compare(self, cases, results, options):
+        """Сравнение с сохраненными результатами"""
+        failures = []
+        with open(options['baseline']) as file:
+            baseline = json.load(file)
+        for case in cases:
+            previous = baseline.get(case.name)
+            if previous is None:
+                continue
+            result = results[case.name]
+            if result['queries'] > previous['queries']:
+                failures.append(
+                    f'{case.name}: SQL-запросов {result["queries"]}, '
+                    f'было {previous["queries"]}'
+                )
+            limit = previous['p50'] * (1 + options['max_regression'])
+            if (
+                result['p50'] > limit
+                and result['p50'] - previous['p50'] > MIN_REGRESSION_MS
+            ):
+                failures.append(
+                    f'{case.name}: медиана {result["p50"]:.2f} мс, '
+                    f'было {previous["p50"]:.2f} мс'
+                )
+        return failures
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.async_views import (DETAIL_ACTIONS, LIST_ACTIONS, async_read,
+                             ingredient_list, recipe_detail, recipe_list,
+                             tag_list)
+from api.views import IngredientsViewSet, RecipesViewSet, TagViewSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from recipes.models import Recipes
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .benchmark_api import percentile
+
+# Имя, путь, вьюсет, действия вьюсета и корутина асинхронного пути
+ENDPOINTS = (
+    ('recipes-list', '/api/recipes/', RecipesViewSet, LIST_ACTIONS,
+     recipe_list),
+    ('recipes-detail', '/api/recipes/{recipe}/', RecipesViewSet,
+     DETAIL_ACTIONS, recipe_detail),
+    ('tags-list', '/api/tags/', TagViewSet, LIST_ACTIONS, tag_list),
+    ('ingredients-search', '/api/ingredients/?name=са', IngredientsViewSet,
+     LIST_ACTIONS, ingredient_list),
+)
+
+
+class Latency:
+    """Задержка каждого SQL-запроса, как у базы на другом сервере"""
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def connect(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    help = (
+        ' Пропускная способность синхронного и асинхронного путей чтения '
+        'на данных текущей базы. Синхронный путь обрабатывает запросы '
+        'в --threads потоках, как sync-воркер gunicorn, асинхронный - '
+        'до --concurrency запросов одновременно в одном цикле событий '
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Число запросов к каждому эндпоинту',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Одновременных запросов в асинхронном пути',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=1,
+            help='Потоков синхронного пути',
+        )
+        parser.add_argument(
+            '--db-latency',
+            type=float,
+            default=2.0,
+            help='Добавочная задержка SQL-запроса, мс',
+        )
+        parser.add_argument(
+            '--auth',
+            action='store_true',
+            help='Запросы с токеном первого пользователя',
+        )
+
+    def handle(self, *args, **options):
+        recipe = Recipes.objects.order_by('id').first()
+        if recipe is None:
+            raise CommandError(
+                'Нет рецептов, создайте данные командой generate_fixtures'
+            )
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        database = connections['default'].settings_dict
+        if not database['CONN_MAX_AGE'] and not database.get('POOL_SIZE'):
+            self.stdout.write(self.style.WARNING(
+                'CONN_MAX_AGE = 0: потоки асинхронного пути открывают '
+                'соединение на каждый запрос к базе'
+            ))
+        headers = {}
+        if options['auth']:
+            token, _ = Token.objects.get_or_create(
+                user=User.objects.order_by('id').first()
+            )
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        latency = Latency(options['db_latency'] / 1000)
+        connection_created.connect(latency.connect)
+        for connection in connections.all():
+            connection.close()
+        try:
+            results = [
+                self.measure(endpoint, recipe.id, headers, options)
+                for endpoint in ENDPOINTS
+            ]
+        finally:
+            connection_created.disconnect(latency.connect)
+            connections.close_all()
+        self.report(results)
+
+    def measure(self, endpoint, recipe_id, headers, options):
+        name, path, viewset, actions, handler = endpoint
+        kwargs = {'pk': recipe_id} if '{recipe}' in path else {}
+        path = path.format(recipe=recipe_id)
+        factory = RequestFactory()
+
+        def request():
+            return factory.get(path, **headers)
+
+        sync_view = viewset.as_view(
+            {
+                method: action for method, action in actions.items()
+                if hasattr(viewset, action)
+            },
+            basename=name.split('-')[0],
+            detail=bool(kwargs),
+        )
+
+        def call_sync(_):
+            started = time.perf_counter()
+            response = sync_view(request(), **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            self.check_response(name, response)
+            return time.perf_counter() - started
+
+        total = options['requests']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            sync_timings = list(pool.map(call_sync, range(total)))
+        sync_elapsed = time.perf_counter() - started
+
+        async_view = async_read(handler, viewset, actions)
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def call_async():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await async_view(request(), **kwargs)
+                self.check_response(name, response)
+                return time.perf_counter() - started
+
+        async def run_async():
+            return await asyncio.gather(*(call_async() for _ in range(total)))
+
+        started = time.perf_counter()
+        async_timings = asyncio.run(run_async())
+        async_elapsed = time.perf_counter() - started
+        return (
+            name,
+            total / sync_elapsed, percentile(sync_timings, 0.5) * 1000,
+            total / async_elapsed, percentile(async_timings, 0.5) * 1000,
+        )
+
+    def check_response(self, name, response):
+        if response.status_code != 200:
+            raise CommandError(
+                f'{name}: ответ {response.status_code} {response.content!r}'
+            )
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"эндпоинт":<20} {"sync, rps":>10} {"p50, мс":>8} '
+            f'{"async, rps":>10} {"p50, мс":>8} {"прирост":>8}'
+        )
+        for name, sync_rps, sync_p50, async_rps, async_p50 in results:
+            self.stdout.write(
+                f'{name:<20} {sync_rps:>10.1f} {sync_p50:>8.2f} '
+                f'{async_rps:>10.1f} {async_p50:>8.2f} '
+                f'{async_rps / sync_rps:>7.1f}x'
+            )
@@ -0,0 +1,59 @@
+import timeit
+
+from api.serializers import RecipeReadSerializer
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch, Value
+from drf_extra_fields.fields import Base64ImageField
+from recipes.models import RecipeIngredients, Recipes
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+
+class Base64ImageReadSerializer(RecipeReadSerializer):
+    """Прежний сериализатор просмотра с полем Base64ImageField"""
+    image = Base64ImageField()
+
+
+class Command(BaseCommand):
+    help = ' Время сериализации страницы рецептов '
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        recipes = list(Recipes.objects.select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_recipe',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        ).annotate(
+            is_favorited=Value(False),
+            is_in_shopping_cart=Value(False),
+        )[:options['count']])
+        if not recipes:
+            raise CommandError('Нет рецептов для сериализации')
+        page = (recipes * options['count'])[:options['count']]
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        for serializer_class in (
+            Base64ImageReadSerializer,
+            RecipeReadSerializer,
+        ):
+            def serialize():
+                serializer_class(
+                    page, many=True, context={'request': request}
+                ).data
+            best = min(timeit.repeat(
+                serialize, number=1, repeat=options['repeat']
+            ))
+            self.stdout.write(
+                f'{serializer_class.__name__}: {len(page)} рецептов '
+                f'за {best * 1000:.2f} мс'
+            )
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from api.serializers import CreateRecipesSerializer
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredients, Tags
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ' Число SQL-запросов при создании и изменении рецепта '
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            nargs='+',
+            default=[1, 3, 6, 20, 100],
+            help='Количество ингредиентов в рецепте',
+        )
+
+    def handle(self, *args, **options):
+        sizes = options['ingredients']
+        pool_size = max(sizes) + max(sizes) // 2
+        author = User.objects.first()
+        tags = list(Tags.objects.all()[:2])
+        pool = list(Ingredients.objects.all()[:pool_size])
+        if author is None or not tags or len(pool) < pool_size:
+            raise CommandError(
+                'Нужны пользователь, теги и не менее '
+                f'{pool_size} ингредиентов'
+            )
+        serializer = CreateRecipesSerializer(
+            context={'request': SimpleNamespace(user=author)}
+        )
+        self.stdout.write('ингредиентов  create  update')
+        for size in sizes:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as create_queries:
+                    recipe = serializer.create({
+                        'name': 'benchmark',
+                        'text': 'benchmark',
+                        'cooking_time': 1,
+                        'image': 'recipes/benchmark.png',
+                        'tags': tags[:1],
+                        'ingredients': [
+                            {'id': ingredient, 'amount': 1}
+                            for ingredient in pool[:size]
+                        ],
+                    })
+                kept = pool[:size // 2 + 1]
+                added = pool[size:size + size // 2]
+                with CaptureQueriesContext(connection) as update_queries:
+                    serializer.update(recipe, {
+                        'tags': tags,
+                        'ingredients': [
+                            {'id': ingredient, 'amount': 2}
+                            for ingredient in kept + added
+                        ],
+                    })
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'{size:>12}  {len(create_queries):>6}  '
+                f'{len(update_queries):>6}'
+            )
@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from recipes.catalog import get_catalog_version
+from rest_framework.renderers import JSONRenderer
+
+
+@lru_cache(maxsize=8)
+def serialized_catalog(view_class, version):
+    """
+    Полный список справочника в JSON и в gzip для версии version.
+    Читается из основной базы: реплика может еще не знать об изменении,
+    после которого сменилась версия.
+    """
+    data = view_class.serializer_class(
+        view_class.queryset.using(DEFAULT_DB_ALIAS), many=True
+    ).data
+    content = JSONRenderer().render(data)
+    return content, gzip.compress(content, mtime=0)
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+class CatalogCacheMixin:
+    """
+    Кэширование справочников на клиенте.
+    ETag строится по версии справочника, поэтому на If-None-Match
+    ответ 304 отдается после одного запроса версии. Полный список без фильтров
+    отдается готовым, заранее сжатым JSON.
+    """
+    def catalog_version(self):
+        """Версия справочника, читается из базы один раз за запрос"""
+        if getattr(self, '_catalog_version', None) is None:
+            self._catalog_version = get_catalog_version(self.queryset.model)
+        return self._catalog_version
+
+    def get_catalog_etag(self, request):
+        version = self.catalog_version()
+        variant = '|'.join((
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            'gzip' if accepts_gzip(request) else '',
+        ))
+        digest = hashlib.md5(variant.encode()).hexdigest()
+        return f'"{version}-{digest}"'
+
+    def set_catalog_headers(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE
+        )
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+    def is_not_modified(self, request, etag):
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        return etag in if_none_match or '*' in if_none_match
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        etag = self.get_catalog_etag(request)
+        if self.is_not_modified(request, etag):
+            return self.set_catalog_headers(HttpResponseNotModified(), etag)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            self.set_catalog_headers(response, etag)
+        return response
+
+    def serialized_list(self, request):
+        """Готовый JSON полного списка, сжатый, если клиент принимает gzip"""
+        content, compressed = serialized_catalog(
+            type(self), self.catalog_version()
+        )
+        if not accepts_gzip(request):
+            return HttpResponse(content, content_type='application/json')
+        response = HttpResponse(compressed, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return self.serialized_list(request)
@@ -1,6 +1,160 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Пагинатор с оценкой числа записей по статистике PostgreSQL.
+    Оценка используется только для запросов без условий
+    и только для больших таблиц, иначе выполняется COUNT(*).
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if (
+            not settings.PAGINATION_APPROXIMATE_COUNT
+            or not isinstance(queryset, QuerySet)
+            or connections[queryset.db].vendor != 'postgresql'
+            or queryset.query.where
+        ):
+            return super().count
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        estimate = int(row[0]) if row else -1
+        if estimate < settings.PAGINATION_APPROXIMATE_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по курсору.
+    Следующая страница начинается после последней записи текущей
+    по полям view.keyset_ordering, поэтому не нужны OFFSET и COUNT(*).
+    """
+    cursor_query_param = 'cursor'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def encode_cursor(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def decode_cursor(self, request, model):
+        """
+        Позиция из курсора, значения приведены к типам полей модели,
+        чтобы подделанный курсор давал 404, а не ошибку в запросе.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound('Неверный курсор')
+        if not isinstance(position, list) or (
+            len(position) != len(self.ordering)
+        ):
+            raise NotFound('Неверный курсор')
+        try:
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound('Неверный курсор')
+        if None in position:
+            raise NotFound('Неверный курсор')
+        return position
+
+    def after(self, position):
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        position = self.decode_cursor(request, queryset.model)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > self.page_size
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
 
 
 class Pagination(PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы.
+    С параметром cursor (пустым для первой страницы) во вьюсетах
+    с keyset_ordering выводит страницы запроса по курсору.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = ApproximateCountPaginator
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'keyset_ordering', None)
+        if (
+            ordering is None
+            or not isinstance(queryset, QuerySet)
+            or KeysetPagination.cursor_query_param not in request.query_params
+        ):
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset = KeysetPagination(ordering, self.get_page_size(request))
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.core.cache import cache
+from recipes.catalog import bump_version, get_version
+from social.models import FavoritesList, FollowsList, ShoppingList
+
+CACHE_KEY = 'viewer_relations:{}'
+SET_KEY = 'viewer_relations:{}:{}:{}'
+
+
+# Источник каждого множества связей: модель и поле с id объекта
+SOURCES = {
+    'favorites': (FavoritesList, 'recipe_id'),
+    'shopping': (ShoppingList, 'recipe_id'),
+    'follows': (FollowsList, 'author_id'),
+}
+
+
+class ViewerRelations:
+    """
+    Связи текущего пользователя: избранное, список покупок и подписки.
+    Каждое множество загружается одним запросом при первой проверке,
+    дальше проверки отвечают из памяти. При заданной версии связей
+    пользователя множества хранятся в кэше под ключами этой версии:
+    после сброса запрос, загрузивший множество раньше, пишет его под
+    старую версию, которую уже никто не читает.
+    """
+    def __init__(self, user_id=None, version=None, **sets):
+        self.user_id = user_id
+        self.version = version
+        self.sets = {name: frozenset(ids) for name, ids in sets.items()}
+
+    def get(self, name):
+        ids = self.sets.get(name)
+        if ids is not None:
+            return ids
+        key = None
+        if self.version is not None:
+            key = SET_KEY.format(self.user_id, self.version, name)
+            ids = cache.get(key)
+        if ids is None:
+            ids = frozenset()
+            if self.user_id is not None:
+                model, field = SOURCES[name]
+                ids = frozenset(model.objects.filter(
+                    user_id=self.user_id
+                ).values_list(field, flat=True))
+            if key is not None:
+                cache.set(key, ids, settings.VIEWER_RELATIONS_CACHE_TIMEOUT)
+        self.sets[name] = ids
+        return ids
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.get('favorites')
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.get('shopping')
+
+    def is_subscribed(self, author_id):
+        return author_id in self.get('follows')
+
+
+EMPTY_RELATIONS = ViewerRelations(favorites=(), shopping=(), follows=())
+
+
+def get_viewer_relations(request):
+    """
+    Связи пользователя запроса. Результат хранится на объекте запроса,
+    а при заданном VIEWER_RELATIONS_CACHE_TIMEOUT и в кэше между запросами.
+    """
+    if request is None or request.user.is_anonymous:
+        return EMPTY_RELATIONS
+    relations = getattr(request, '_viewer_relations', None)
+    if relations is not None:
+        return relations
+    version = None
+    if settings.VIEWER_RELATIONS_CACHE_TIMEOUT:
+        version = get_version(CACHE_KEY.format(request.user.pk))
+    relations = ViewerRelations(request.user.pk, version)
+    request._viewer_relations = relations
+    return relations
+
+
+def invalidate_viewer_relations(request):
+    """Сброс связей пользователя после изменения подписок или списков"""
+    request._viewer_relations = None
+    bump_version(CACHE_KEY.format(request.user.pk))
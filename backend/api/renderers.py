@@ -0,0 +1,81 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_LIST_TITLE = 'Купить в магазине:'
+SHOPPING_LIST_FIELDS = (
+    'ingredient__name',
+    'ingredient__measurement_unit',
+    'amount',
+)
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку"""
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+    Метод stream построчно отдает файл, не собирая его в памяти,
+    render используется для ответов с ошибками.
+    """
+    charset = 'utf-8'
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return json.dumps(data, ensure_ascii=False).encode(self.charset)
+        return ''.join(self.stream(data)).encode(self.charset)
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Список покупок в текстовом файле"""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield SHOPPING_LIST_TITLE
+        for ingredient in ingredients:
+            yield (
+                f"\n{ingredient['ingredient__name']} "
+                f"({ingredient['ingredient__measurement_unit']}) - "
+                f"{ingredient['amount']}"
+            )
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Список покупок в CSV"""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            yield writer.writerow(
+                [ingredient[field] for field in SHOPPING_LIST_FIELDS]
+            )
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Список покупок в JSON"""
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, ingredients):
+        separator = ''
+        yield '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['amount'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from foodgram.db.replicas import primary_reads
+from foodgram.metrics import registry
+from recipes.catalog import bump_version, get_version
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .pagination import Pagination
+
+GENERATION = 'recipes_list'
+KEY = 'recipes_list:{}:{}'
+LOCK_KEY = '{}:lock'
+# Параметры, от которых зависит список для анонимного пользователя.
+# Запросы с другими параметрами (поиск, сортировка, курсор) не кэшируются.
+PARAMS = frozenset(('tags', 'author', 'page', 'limit'))
+# Срок блокировки заполнения записи и время, которое остальные запросы
+# ждут ее результат, прежде чем выполнить запрос сами, в секундах
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 5
+POLL_INTERVAL = 0.05
+
+
+def get_backend():
+    return caches['responses']
+
+
+def get_generation():
+    """Поколение кэша, меняется при изменении рецептов и тегов"""
+    return get_version(GENERATION, get_backend())
+
+
+def invalidate_recipe_lists(sender, **kwargs):
+    """
+    Обработчик сигналов изменения рецептов, тегов и ингредиентов рецептов.
+    Поколение меняется после фиксации транзакции, чтобы запрос,
+    заполняющий кэш, не сохранил под новым поколением старые данные.
+    """
+    transaction.on_commit(lambda: bump_version(GENERATION, get_backend()))
+
+
+def cache_key(request):
+    """
+    Ключ ответа списка рецептов по нормализованным параметрам: порядок
+    и повторы тегов, страница 1 и размер страницы по умолчанию не важны.
+    None, если ответ зависит от пользователя или формата.
+    """
+    if (
+        not settings.RECIPE_LIST_CACHE_TIMEOUT
+        or request.method != 'GET'
+        or not request.user.is_anonymous
+        or not PARAMS.issuperset(request.query_params.keys())
+        or 'text/html' in request.META.get('HTTP_ACCEPT', '')
+    ):
+        return None
+    params = request.query_params
+    variant = json.dumps((
+        request.build_absolute_uri('/'),
+        sorted(set(params.getlist('tags'))),
+        params.get('author'),
+        params.get(Pagination.page_query_param) or '1',
+        params.get(Pagination.page_size_query_param)
+        or str(Pagination.page_size),
+    ))
+    return KEY.format(
+        get_generation(), hashlib.md5(variant.encode()).hexdigest()
+    )
+
+
+def rendered(response):
+    """Тело успешного ответа для кэша, None для остальных ответов"""
+    if response.status_code != 200:
+        return None
+    if isinstance(response, Response):
+        return JSONRenderer().render(response.data)
+    return response.content
+
+
+def cached_response(content, result):
+    registry.cached(result)
+    return HttpResponse(content, content_type='application/json')
+
+
+class Flight:
+    """Заполнение записи кэша, результата которого ждут другие запросы"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.content = None
+
+
+class RecipeListCache:
+    """
+    Кэш ответов списка рецептов для анонимных пользователей.
+    Для них отметки избранного и покупок всегда ложны, поэтому
+    одинаковые параметры дают одинаковый ответ. Запись заполняет
+    один запрос: в процессе остальные ждут его результат, между
+    процессами - блокировку в кэше. Данные для записи читаются
+    из основной базы, чтобы отстающая реплика не попала в новое поколение.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.async_flights = {}
+
+    def respond(self, request, compute):
+        """Ответ из кэша или от compute() с сохранением в кэш"""
+        key = cache_key(request)
+        if key is None:
+            return compute()
+        content = get_backend().get(key)
+        if content is not None:
+            return cached_response(content, 'hit')
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if not leader:
+            flight.done.wait(WAIT_TIMEOUT)
+            if flight.content is None:
+                return compute()
+            return cached_response(flight.content, 'coalesced')
+        try:
+            response = self.fill(key, compute)
+            flight.content = rendered(response)
+            return response
+        finally:
+            flight.done.set()
+            with self.lock:
+                del self.flights[key]
+
+    def fill(self, key, compute):
+        backend = get_backend()
+        lock = LOCK_KEY.format(key)
+        locked = backend.add(lock, True, LOCK_TIMEOUT)
+        if not locked:
+            deadline = time.monotonic() + WAIT_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                content = backend.get(key)
+                if content is not None:
+                    return cached_response(content, 'coalesced')
+        try:
+            with primary_reads():
+                response = compute()
+            content = rendered(response)
+            if content is None:
+                return response
+            backend.set(key, content, settings.RECIPE_LIST_CACHE_TIMEOUT)
+            return cached_response(content, 'miss')
+        finally:
+            if locked:
+                backend.delete(lock)
+
+    async def arespond(self, request, compute):
+        """
+        Асинхронный вариант respond: compute - корутина, обращения
+        к кэшу выполняются в пуле потоков.
+        """
+        key = await sync_to_async(cache_key, thread_sensitive=False)(
+            request
+        )
+        if key is None:
+            return await compute()
+        backend = get_backend()
+        content = await sync_to_async(
+            backend.get, thread_sensitive=False
+        )(key)
+        if content is not None:
+            return cached_response(content, 'hit')
+        # Под WSGI каждый вызов асинхронного представления идет в своем
+        # цикле событий, ожидать можно только заполнение в том же цикле
+        loop = asyncio.get_running_loop()
+        flight = self.async_flights.get((loop, key))
+        if flight is not None:
+            try:
+                content = await asyncio.wait_for(
+                    asyncio.shield(flight), WAIT_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                content = None
+            if content is None:
+                return await compute()
+            return cached_response(content, 'coalesced')
+        flight = self.async_flights[(loop, key)] = loop.create_future()
+        content = None
+        try:
+            response = await self.afill(backend, key, compute)
+            content = rendered(response)
+            return response
+        finally:
+            flight.set_result(content)
+            del self.async_flights[(loop, key)]
+
+    async def afill(self, backend, key, compute):
+        lock = LOCK_KEY.format(key)
+        locked = await sync_to_async(backend.add, thread_sensitive=False)(
+            lock, True, LOCK_TIMEOUT
+        )
+        if not locked:
+            deadline = time.monotonic() + WAIT_TIMEOUT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(POLL_INTERVAL)
+                content = await sync_to_async(
+                    backend.get, thread_sensitive=False
+                )(key)
+                if content is not None:
+                    return cached_response(content, 'coalesced')
+        try:
+            with primary_reads():
+                response = await compute()
+            content = rendered(response)
+            if content is None:
+                return response
+            await sync_to_async(backend.set, thread_sensitive=False)(
+                key, content, settings.RECIPE_LIST_CACHE_TIMEOUT
+            )
+            return cached_response(content, 'miss')
+        finally:
+            if locked:
+                await sync_to_async(
+                    backend.delete, thread_sensitive=False
+                )(lock)
+
+
+recipe_list_cache = RecipeListCache()
@@ -1,13 +1,98 @@
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils.encoding import filepath_to_uri
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from recipes.images import delete_variants, schedule_variants
 from recipes.models import Ingredients, RecipeIngredients, Recipes, Tags
+from recipes.pantry import recipe_changed
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
+from social.feed import fan_out_recipe
 from social.models import FavoritesList, FollowsList, ShoppingList
+from social.totals import amounts_difference, recipe_ingredients_changed
 from users.models import User
 
+from .relations import get_viewer_relations
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Изображение рецепта: строка base64 в JSON или файл в multipart/form-data.
+    Размер и число пикселей проверяются до декодирования изображения,
+    по длине строки или файла и по заголовку.
+    """
+    def check_limits(self, file):
+        if file.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise ValidationError('Размер изображения слишком большой')
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            raise ValidationError('Загрузите корректное изображение')
+        finally:
+            file.seek(0)
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise ValidationError('Разрешение изображения слишком большое')
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self.check_limits(data)
+            extension = os.path.splitext(data.name)[1].lower()
+            data.name = self.get_file_name(data) + extension
+            return serializers.ImageField.to_internal_value(self, data)
+        if (
+            isinstance(data, str)
+            and len(data) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE
+        ):
+            raise ValidationError('Размер изображения слишком большой')
+        file = super().to_internal_value(data)
+        self.check_limits(file)
+        return file
+
+
+class MediaURLField(serializers.ReadOnlyField):
+    """
+    Ссылка на файл в MEDIA_URL без обращения к хранилищу и к Pillow.
+    Абсолютный адрес MEDIA_URL строится один раз за запрос.
+    """
+    def get_media_url(self):
+        request = self.context.get('request')
+        if request is None:
+            return settings.MEDIA_URL
+        media_url = getattr(request, '_media_url', None)
+        if media_url is None:
+            media_url = request.build_absolute_uri(settings.MEDIA_URL)
+            request._media_url = media_url
+        return media_url
+
+    def to_representation(self, file):
+        if not file:
+            return None
+        return self.get_media_url() + filepath_to_uri(file.name)
+
+
+class ImageSrcsetField(MediaURLField):
+    """
+    Варианты изображения в виде srcset для каждого формата:
+    {"webp": "<url> 320w, <url> 640w", ...}
+    """
+    def to_representation(self, variants):
+        media_url = self.get_media_url()
+        return {
+            extension: ', '.join(
+                f'{media_url}{filepath_to_uri(name)} {width}w'
+                for width, name in widths.items()
+            )
+            for extension, widths in variants.items()
+        }
+
 
 class RecipesFavoritesSerializer(serializers.ModelSerializer):
     """Сериализатор избранных рецептов"""
@@ -37,12 +122,11 @@ class UserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, author):
-        return (not self.context.get('request').user.is_anonymous
-                and FollowsList.objects.filter(
-                user=self.context.get('request').user,
-                author=author
-                ).exists()
-                )
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
+        return get_viewer_relations(
+            self.context.get('request')
+        ).is_subscribed(author.id)
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -76,14 +160,19 @@ class SubscriptionsSerializer(UserSerializer):
         )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[: int(limit)]
+        if hasattr(obj, 'recent_recipes'):
+            recipes = obj.recent_recipes
+        else:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit:
+                recipes = recipes[: int(limit)]
         serializer = RecipeFieldsSerializer(
             recipes,
             many=True,
@@ -180,15 +269,24 @@ class ShoppingListSerializer(serializers.ModelSerializer):
                 )
             return data
 
+    @transaction.atomic
+    def create(self, validated_data):
+        # Сводный список покупок обновляет сигнал в той же транзакции
+        return super().create(validated_data)
+
 
 class RecipeFieldsSerializer(serializers.ModelSerializer):
     """Сериализатор для полей избранных и списка покупок"""
+    image = MediaURLField()
+    image_srcset = ImageSrcsetField(source='image_variants')
+
     class Meta:
         model = Recipes
         fields = (
             'id',
             'name',
             'image',
+            'image_srcset',
             'cooking_time',
         )
 
@@ -240,7 +338,7 @@ class CreateRecipesSerializer(serializers.ModelSerializer):
             'does_not_exist': 'Указанного тега не существует'
         }
     )
-    image = Base64ImageField()
+    image = RecipeImageField()
     author = UserSerializer(
         read_only=True,
     )
@@ -313,12 +411,54 @@ class CreateRecipesSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def create_ingredients(ingredients, recipe):
-        for ingredient in ingredients:
-            RecipeIngredients.objects.create(
+        RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(
                 recipe=recipe, ingredient=ingredient['id'],
                 amount=ingredient['amount']
             )
+            for ingredient in ingredients
+        ])
+
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        """
+        Запись только изменившихся ингредиентов рецепта.
+        Возвращает разницу количеств для сводных списков покупок.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_recipe.all()
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        new_amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            RecipeIngredients.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredients.objects.bulk_update(changed, ('amount',))
+        CreateRecipesSerializer.create_ingredients(
+            [
+                ingredient for ingredient in ingredients
+                if ingredient['id'].id not in current
+            ],
+            recipe,
+        )
+        return amounts_difference(old_amounts, new_amounts)
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
@@ -326,30 +466,29 @@ class CreateRecipesSerializer(serializers.ModelSerializer):
         recipe = Recipes.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        recipe_changed(recipe.id)
+        fan_out_recipe(recipe)
+        schedule_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        context = self.context['request']
-        tags_set = context.data['tags']
-        recipe = instance
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        instance.image = validated_data.get('image', instance.image)
-        instance.save()
-        instance.tags.set(tags_set)
-        RecipeIngredients.objects.filter(recipe=instance).delete()
-        ingredients_req = context.data['ingredients']
-        for ingredient in ingredients_req:
-            ingredient_model = Ingredients.objects.get(id=ingredient['id'])
-            RecipeIngredients.objects.create(
-                recipe=recipe,
-                ingredient=ingredient_model,
-                amount=ingredient['amount'],
-            )
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            # Варианты прежнего изображения не должны попасть в srcset,
+            # пока новые не готовы или если их не удалось создать
+            delete_variants(instance.image_variants or {})
+            validated_data['image_variants'] = {}
+        instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            schedule_variants(instance)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            if any(self.update_ingredients(ingredients, instance).values()):
+                recipe_ingredients_changed(instance.id)
+            recipe_changed(instance.id)
         return instance
 
     def to_representation(self, instance):
@@ -374,7 +513,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = MediaURLField()
+    image_srcset = ImageSrcsetField(source='image_variants')
 
     class Meta:
         model = Recipes
@@ -387,6 +527,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time',
         )
@@ -399,15 +540,25 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         ).data
 
     def get_is_favorited(self, obj):
-        return (not self.context.get('request').user.is_anonymous
-                and obj.favorites.filter(
-                user=self.context.get('request').user
-                ).exists()
-                )
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return get_viewer_relations(
+            self.context.get('request')
+        ).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        return (not self.context.get('request').user.is_anonymous
-                and obj.shopping.filter(
-                user=self.context.get('request').user
-                ).exists()
-                )
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return get_viewer_relations(
+            self.context.get('request')
+        ).is_in_shopping_cart(obj.id)
+
+
+class PantryRecipeSerializer(RecipeReadSerializer):
+    """Рецепт с долей ингредиентов, которые есть у пользователя"""
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'coverage',
+        )
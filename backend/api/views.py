@@ -1,24 +1,44 @@
-from django.db.models import Sum
-from django.http.response import HttpResponse
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Value,
+                              Window)
+from django.db.models.functions import RowNumber
+from django.http.response import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from recipes.models import Ingredients, RecipeIngredients, Recipes, Tags
+from recipes.pantry import pantry_index
+from recipes.search import autocomplete_ingredients
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
-from social.models import FavoritesList, FollowsList, ShoppingList
+from social.counters import change_counter
+from social.feed import feed_filter, follow_author, unfollow_author
+from social.models import (FavoritesList, FollowsList, ShoppingCartTotals,
+                           ShoppingList)
 from users.models import User
 
-from .filters import IngredientsFilter, RecipesFilter
+from .exceptions import PayloadTooLarge
+from .filters import POPULAR_ORDERING, RecipesFilter
+from .mixins import CatalogCacheMixin
 from .pagination import Pagination
 from .permissions import IsOwnerOrReadOnly
+from .relations import invalidate_viewer_relations
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListTextRenderer)
+from .response_cache import recipe_list_cache
 from .serializers import (CreateRecipesSerializer, FavoriteListSerializer,
-                          IngredientsSerializer, RecipeReadSerializer,
-                          ShoppingListSerializer, SubscriptionsSerializer,
-                          TagsSerializer, UserSerializer)
+                          IngredientsSerializer, PantryRecipeSerializer,
+                          RecipeReadSerializer, ShoppingListSerializer,
+                          SubscriptionsSerializer, TagsSerializer,
+                          UserSerializer)
 
 
 class UserViewSet(UserViewSet):
@@ -26,6 +46,7 @@ class UserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = Pagination
+    keyset_ordering = ('username', 'id')
 
     @action(
         detail=True,
@@ -43,21 +64,29 @@ class UserViewSet(UserViewSet):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            FollowsList.objects.create(
-                user=user,
-                author=author
-            )
+            with transaction.atomic():
+                FollowsList.objects.create(
+                    user=user,
+                    author=author
+                )
+                change_counter(User, author.id, 'followers_count', 1)
+                follow_author(user, author)
+            invalidate_viewer_relations(request)
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED
             )
 
         if request.method == 'DELETE':
-            get_object_or_404(
-                FollowsList,
-                user=user,
-                author=author
-            ).delete()
+            with transaction.atomic():
+                get_object_or_404(
+                    FollowsList,
+                    user=user,
+                    author=author
+                ).delete()
+                change_counter(User, author.id, 'followers_count', -1)
+                unfollow_author(user, author)
+            invalidate_viewer_relations(request)
             return Response(
                 status=status.HTTP_204_NO_CONTENT
             )
@@ -66,6 +95,38 @@ class UserViewSet(UserViewSet):
             status=status.HTTP_404_NOT_FOUND
         )
 
+    @staticmethod
+    def attach_recipes(authors, limit):
+        """
+        Последние рецепты авторов страницы одним запросом:
+        не более limit рецептов на автора через ROW_NUMBER().
+        """
+        recipes = Recipes.objects.filter(
+            author__in=authors
+        ).only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time',
+            'author_id',
+        )
+        if limit and limit.isdigit():
+            ranked = recipes.annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=(F('pub_date').desc(), F('id').desc()),
+                )
+            )
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipes.objects.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+                'ORDER BY author_id, row_number',
+                (*params, int(limit)),
+            )
+        by_author = {author.id: [] for author in authors}
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.recent_recipes = by_author[author.id]
+
     @action(
         detail=False,
         permission_classes=[IsAuthenticated]
@@ -74,8 +135,12 @@ class UserViewSet(UserViewSet):
         user = request.user
         queryset = User.objects.filter(
             following__user=user
-        )
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True),
+        ).order_by('username', 'id')
         pages = self.paginate_queryset(queryset)
+        self.attach_recipes(pages, request.query_params.get('recipes_limit'))
         serializer = SubscriptionsSerializer(
             pages,
             many=True,
@@ -84,7 +149,7 @@ class UserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """Вывод тегов"""
     queryset = Tags.objects.all()
     permission_classes = (
@@ -93,63 +158,191 @@ class TagViewSet(viewsets.ModelViewSet):
     serializer_class = TagsSerializer
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Вывод ингредиентов"""
     queryset = Ingredients.objects.all()
     permission_classes = (
         IsAuthenticatedOrReadOnly,
     )
     serializer_class = IngredientsSerializer
-    filter_backends = (
-        IngredientsFilter,
-    )
-    search_fields = (
-        '^name',
-    )
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_serializer(
+            autocomplete_ingredients(name, self.catalog_version()),
+            many=True
+        )
+        return Response(serializer.data)
 
 
 class RecipesViewSet(viewsets.ModelViewSet):
-    """ Вывод работы с рецептами """
+    """
+    Вывод работы с рецептами.
+    Рецепт принимается в JSON с изображением в base64 или в
+    multipart/form-data с файлом изображения, ингредиенты в форме
+    передаются как ingredients[0]id, ingredients[0]amount.
+    """
     queryset = Recipes.objects.all()
     serializer_class = CreateRecipesSerializer
     permission_classes = (
         IsOwnerOrReadOnly,
     )
+    parser_classes = (
+        JSONParser,
+        FormParser,
+        MultiPartParser,
+    )
     pagination_class = Pagination
     filter_backends = (
         DjangoFilterBackend,
     )
     filterset_class = RecipesFilter
 
+    @property
+    def keyset_ordering(self):
+        # Порядок по рангу поиска не выражается полями записи,
+        # поэтому результаты поиска выводятся по номеру страницы
+        if self.request.query_params.get('search'):
+            return None
+        if self.request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return ('-pub_date', '-id')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        content_length = request.META.get('CONTENT_LENGTH') or '0'
+        if (
+            content_length.isdigit()
+            and int(content_length) > settings.RECIPE_UPLOAD_MAX_SIZE
+        ):
+            raise PayloadTooLarge()
+
+    def list(self, request, *args, **kwargs):
+        return recipe_list_cache.respond(
+            request, lambda: super(RecipesViewSet, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Recipes.objects.prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_recipe',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+        if user.is_anonymous:
+            return queryset.select_related('author').annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=Exists(FollowsList.objects.filter(
+                        user=user, author=OuterRef('pk')
+                    ))
+                ),
+            )
+        ).annotate(
+            is_favorited=Exists(FavoritesList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return CreateRecipesSerializer
 
-    @staticmethod
-    def send_message(ingredients):
-        shopping_list = 'Купить в магазине:'
-        for ingredient in ingredients:
-            shopping_list += (
-                f"\n{ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__measurement_unit']}) - "
-                f"{ingredient['amount']}")
-        file = 'shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename="{file}.txt"'
-        return response
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request):
+        queryset = self.filter_queryset(
+            self.get_queryset()
+        ).filter(feed_filter(request.user))
+        pages = self.paginate_queryset(queryset)
+        serializer = RecipeReadSerializer(
+            pages,
+            many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+    )
+    def pantry(self, request):
+        """
+        Рецепты из имеющихся продуктов: ?ingredients=1,2,3.
+        Сначала выводятся рецепты с наибольшей долей имеющихся ингредиентов.
+        """
+        ingredient_ids = [
+            value
+            for values in request.query_params.getlist('ingredients')
+            for value in values.split(',') if value
+        ]
+        if not ingredient_ids or not all(
+            re.fullmatch(r'\d+', value, re.ASCII)
+            for value in ingredient_ids
+        ):
+            raise ValidationError({
+                'ingredients': 'Укажите id ингредиентов через запятую'
+            })
+        ranked = pantry_index.match(map(int, ingredient_ids))
+        pages = self.paginate_queryset(ranked)
+        coverage = dict(pages)
+        recipes = self.get_queryset().in_bulk(coverage)
+        for recipe_id, recipe in recipes.items():
+            recipe.coverage = round(coverage[recipe_id], 4)
+        serializer = PantryRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _ in pages
+             if recipe_id in recipes],
+            many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=False,
         methods=['GET'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+        ],
     )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredients.objects.filter(
-            recipe__shopping__user=request.user
-        ).order_by('ingredient__name').values(
+        renderer = request.accepted_renderer
+        ingredients = ShoppingCartTotals.objects.filter(
+            user=request.user
+        ).order_by(
             'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        return self.send_message(ingredients)
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).iterator()
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        file = f'shopping_list.{renderer.format}'
+        response['Content-Disposition'] = f'attachment; filename="{file}"'
+        return response
 
     @action(
         detail=True,
@@ -168,7 +361,10 @@ class RecipesViewSet(viewsets.ModelViewSet):
             context=context
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            change_counter(Recipes, recipe.id, 'shopping_count', 1)
+        invalidate_viewer_relations(request)
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED
@@ -176,11 +372,15 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
     @shopping_cart.mapping.delete
     def destroy_shopping_cart(self, request, pk):
-        get_object_or_404(
-            ShoppingList,
-            user=request.user.id,
-            recipe=get_object_or_404(Recipes, id=pk)
-        ).delete()
+        recipe = get_object_or_404(Recipes, id=pk)
+        with transaction.atomic():
+            get_object_or_404(
+                ShoppingList,
+                user=request.user.id,
+                recipe=recipe
+            ).delete()
+            change_counter(Recipes, recipe.id, 'shopping_count', -1)
+        invalidate_viewer_relations(request)
         return Response(
             status=status.HTTP_204_NO_CONTENT
         )
@@ -203,7 +403,10 @@ class RecipesViewSet(viewsets.ModelViewSet):
             context=context
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            change_counter(Recipes, recipe.id, 'favorites_count', 1)
+        invalidate_viewer_relations(request)
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED
@@ -211,11 +414,15 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
     @favorite.mapping.delete
     def destroy_favorite(self, request, pk):
-        get_object_or_404(
-            FavoritesList,
-            user=request.user,
-            recipe=get_object_or_404(Recipes, id=pk)
-        ).delete()
+        recipe = get_object_or_404(Recipes, id=pk)
+        with transaction.atomic():
+            get_object_or_404(
+                FavoritesList,
+                user=request.user,
+                recipe=recipe
+            ).delete()
+            change_counter(Recipes, recipe.id, 'favorites_count', -1)
+        invalidate_viewer_relations(request)
         return Response(
             status=status.HTTP_204_NO_CONTENT
         )
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import deque
+
+from django.db.utils import OperationalError
+
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Пул соединений процесса с не более size открытыми соединениями.
+    Соединение выдается на время жизни соединения Django (запрос или
+    CONN_MAX_AGE) и возвращается при его закрытии. Если свободных нет,
+    acquire ждет до timeout секунд.
+    """
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = deque()
+        self.used = 0
+        self.opened = 0
+        self.waits = 0
+        self.timeouts = 0
+
+    def acquire(self, connect, check=None):
+        """
+        Свободное соединение из пула или новое от connect().
+        Соединения, не прошедшие check, закрываются.
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.waits += 1
+            if not self.slots.acquire(timeout=self.timeout):
+                with self.lock:
+                    self.timeouts += 1
+                raise OperationalError(
+                    f'Нет свободного соединения с базой за {self.timeout} с'
+                )
+        try:
+            while True:
+                with self.lock:
+                    connection = self.idle.pop() if self.idle else None
+                if connection is None or check is None or check(connection):
+                    break
+                self.discard(connection)
+            if connection is None:
+                connection = connect()
+                with self.lock:
+                    self.opened += 1
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.used += 1
+        return connection
+
+    def release(self, connection, reusable):
+        """Возврат соединения в пул, непригодные соединения закрываются"""
+        with self.lock:
+            self.used -= 1
+            if reusable:
+                self.idle.append(connection)
+        if not reusable:
+            self.discard(connection)
+        self.slots.release()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'used': self.used,
+                'idle': len(self.idle),
+                'opened': self.opened,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+            }
+
+
+def get_pool(alias, size, timeout):
+    """
+    Пул соединений базы alias в текущем процессе. После fork пул
+    создается заново: сокеты родителя в дочернем процессе не используются.
+    """
+    with POOLS_LOCK:
+        pool = POOLS.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            POOLS[alias] = ConnectionPool(size, timeout)
+        return POOLS[alias]
+
+
+def pool_stats():
+    """Состояние пулов текущего процесса по псевдонимам баз"""
+    with POOLS_LOCK:
+        pools = sorted(
+            (alias, pool) for alias, pool in POOLS.items()
+            if pool.pid == os.getpid()
+        )
+    return {alias: pool.stats() for alias, pool in pools}
@@ -0,0 +1,111 @@
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2 import extensions
+
+from ..pool import get_pool
+
+
+def ping(connection):
+    """Проверка соединения из пула без открытой после нее транзакции"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с проверкой постоянных соединений и пулом процесса.
+    Дополнительные ключи настроек базы:
+    CONN_HEALTH_CHECKS - перед первым запросом к базе в каждом запросе
+    к API проверять соединение, открытое в предыдущих (как в Django 4.1);
+    POOL_SIZE - размер пула соединений процесса, 0 - без пула;
+    POOL_TIMEOUT - время ожидания свободного соединения пула, в секундах.
+    """
+    health_check_done = False
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_pool(self):
+        size = self.settings_dict.get('POOL_SIZE')
+        if not size:
+            return None
+        return get_pool(
+            self.alias, size, self.settings_dict.get('POOL_TIMEOUT', 10)
+        )
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            ),
+            check=ping if self.health_check_enabled else None,
+        )
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            return pool.release(
+                self.connection, self.is_reusable(self.connection)
+            )
+
+    @staticmethod
+    def is_reusable(connection):
+        """
+        Соединение можно вернуть в пул: незавершенная транзакция
+        откатывается, сломанные соединения закрываются.
+        """
+        if connection.closed:
+            return False
+        try:
+            if (
+                connection.info.transaction_status
+                != extensions.TRANSACTION_STATUS_IDLE
+            ):
+                connection.rollback()
+        except base.Database.Error:
+            return False
+        return (
+            connection.info.transaction_status
+            == extensions.TRANSACTION_STATUS_IDLE
+        )
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+            or self.in_atomic_block
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
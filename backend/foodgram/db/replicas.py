@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Токены и сессии создаются прямо перед первым запросом с ними,
+# поэтому читаются из основной базы
+PRIMARY_APPS = ('authtoken', 'sessions')
+STICKY_KEY = 'primary_reads:{}'
+
+# База для чтения в текущем запросе, None - основная
+read_database = ContextVar('read_database', default=None)
+
+
+def client_key(request):
+    """
+    Ключ клиента для привязки к основной базе: по токену или сессии,
+    без обращения к базе, так как пользователь еще не определен.
+    """
+    credentials = request.META.get('HTTP_AUTHORIZATION') or (
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return STICKY_KEY.format(hashlib.md5(credentials.encode()).hexdigest())
+
+
+@contextmanager
+def primary_reads():
+    """
+    Чтение из основной базы внутри блока, например при заполнении
+    кэша, который должен соответствовать текущей версии данных.
+    """
+    token = read_database.set(None)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Чтение в запросах GET, HEAD и OPTIONS из реплики, выбранной
+    ReplicaMiddleware, остальное - из основной базы. Внутри транзакции
+    и для объектов, уже загруженных из какой-то базы, чтение идет туда же.
+    """
+    def db_for_read(self, model, **hints):
+        if (
+            model._meta.app_label in PRIMARY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Выбор базы для чтения в запросе. Чтение идет из случайной реплики,
+    кроме изменяющих запросов и запросов клиента, который что-то изменил
+    за последние REPLICA_STICKY_SECONDS: они читают из основной базы,
+    чтобы видеть свои изменения, пока реплика отстает.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        key = client_key(request)
+        database = self.choose(request, key)
+        token = read_database.set(database)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        return self.finish(request, response, key, database)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        key = client_key(request)
+        database = self.choose(request, key)
+        token = read_database.set(database)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        return self.finish(request, response, key, database)
+
+    def choose(self, request, key):
+        if request.method not in SAFE_METHODS or (
+            key is not None and cache.get(key)
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def finish(self, request, response, key, database):
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, database
+            )
+        if (
+            request.method not in SAFE_METHODS
+            and key is not None
+            and response.status_code < 400
+        ):
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def stream(self, content, database):
+        """Потоковый ответ читается после выхода из middleware"""
+        previous = read_database.get()
+        read_database.set(database)
+        try:
+            yield from content
+        finally:
+            read_database.set(previous)
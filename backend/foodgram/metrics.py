@@ -0,0 +1,326 @@
+import asyncio
+import ipaddress
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from .db.pool import pool_stats
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+SAMPLED = (
+    ('queries', 'foodgram_request_queries', 'SQL-запросов за запрос'),
+    ('db', 'foodgram_request_db_seconds', 'Время SQL-запросов'),
+    ('serialization', 'foodgram_request_serialization_seconds',
+     'Время рендеринга ответа'),
+    ('size', 'foodgram_response_size_bytes', 'Размер ответа'),
+)
+
+
+def counter_lines(metric, description, label, counts):
+    lines = [
+        f'# HELP {metric} {description}',
+        f'# TYPE {metric} counter',
+    ]
+    for value, count in sorted(counts.items()):
+        lines.append(f'{metric}{{{label}="{value}"}} {count}')
+    return lines
+
+
+class Registry:
+    """
+    Метрики процесса в памяти: число запросов и гистограмма времени
+    для всех запросов, суммы по сэмплированным запросам.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.duration = defaultdict(float)
+        self.sampled = defaultdict(int)
+        self.totals = defaultdict(float)
+        self.connections = defaultdict(int)
+        self.cache = defaultdict(int)
+
+    def observe(self, view, method, status, duration):
+        with self.lock:
+            self.requests[(view, method, status)] += 1
+            self.duration[view] += duration
+            buckets = self.buckets[view]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+
+    def observe_sample(self, view, sample):
+        with self.lock:
+            self.sampled[view] += 1
+            for name, *_ in SAMPLED:
+                self.totals[(view, name)] += sample[name]
+
+    def connected(self, sender, connection, **kwargs):
+        with self.lock:
+            self.connections[connection.alias] += 1
+
+    def cached(self, result):
+        with self.lock:
+            self.cache[result] += 1
+
+    def render(self):
+        """Текстовый формат Prometheus"""
+        with self.lock:
+            lines = [
+                '# HELP foodgram_requests_total Число запросов',
+                '# TYPE foodgram_requests_total counter',
+            ]
+            for (view, method, status), count in sorted(
+                self.requests.items()
+            ):
+                lines.append(
+                    f'foodgram_requests_total{{view="{view}",'
+                    f'method="{method}",status="{status}"}} {count}'
+                )
+            counts = defaultdict(int)
+            for (view, _, _), count in self.requests.items():
+                counts[view] += count
+            lines += [
+                '# HELP foodgram_request_duration_seconds Время запроса',
+                '# TYPE foodgram_request_duration_seconds histogram',
+            ]
+            for view in sorted(counts):
+                for bound, count in zip(DURATION_BUCKETS, self.buckets[view]):
+                    lines.append(
+                        'foodgram_request_duration_seconds_bucket'
+                        f'{{view="{view}",le="{bound}"}} {count}'
+                    )
+                lines += [
+                    'foodgram_request_duration_seconds_bucket'
+                    f'{{view="{view}",le="+Inf"}} {counts[view]}',
+                    'foodgram_request_duration_seconds_sum'
+                    f'{{view="{view}"}} {self.duration[view]:.6f}',
+                    'foodgram_request_duration_seconds_count'
+                    f'{{view="{view}"}} {counts[view]}',
+                ]
+            for name, metric, description in SAMPLED:
+                lines += [
+                    f'# HELP {metric} {description}',
+                    f'# TYPE {metric} summary',
+                ]
+                for view in sorted(self.sampled):
+                    lines += [
+                        f'{metric}_sum{{view="{view}"}} '
+                        f'{self.totals[(view, name)]:.6f}',
+                        f'{metric}_count{{view="{view}"}} '
+                        f'{self.sampled[view]}',
+                    ]
+            lines += counter_lines(
+                'foodgram_db_connects_total',
+                'Подключений к базе (с пулом - получений соединения из пула)',
+                'alias', self.connections,
+            )
+            lines += counter_lines(
+                'foodgram_recipe_list_cache_total',
+                'Ответов списка рецептов из кэша (hit, coalesced) '
+                'и с заполнением (miss)',
+                'result', self.cache,
+            )
+        lines += [
+            '# HELP foodgram_db_pool Состояние пула соединений процесса',
+            '# TYPE foodgram_db_pool gauge',
+        ]
+        for alias, stats in pool_stats().items():
+            for name, value in stats.items():
+                lines.append(
+                    f'foodgram_db_pool{{alias="{alias}",stat="{name}"}} '
+                    f'{value}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+connection_created.connect(registry.connected)
+
+
+def view_name(request):
+    """
+    Имя обработчика для меток: Вьюсет.действие для вьюсетов DRF,
+    путь к функции для остальных представлений.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return f'{view.__module__}.{view.__name__}'
+    action = (getattr(view, 'actions', None) or {}).get(
+        request.method.lower(), request.method.lower()
+    )
+    return f'{cls.__name__}.{action}'
+
+
+class QueryCounter:
+    """Обертка выполнения SQL, считающая запросы и их время"""
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.queries += 1
+
+
+def count_queries(counter):
+    """Подключение счетчика ко всем соединениям с базами"""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(counter))
+    return stack
+
+
+class MetricsMiddleware:
+    """
+    Метрики запросов. Время и число запросов учитываются всегда,
+    доля METRICS_SAMPLE_RATE запросов дополнительно измеряет SQL,
+    время рендеринга и размер ответа и отдает их в Server-Timing.
+    Под ASGI запросы к базе идут в других потоках, поэтому
+    сэмплирование выполняется только под WSGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        request._metrics_serialization = 0.0
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            self.finish(request, response, started)
+            return response
+        counter = QueryCounter()
+        with count_queries(counter):
+            response = self.get_response(request)
+        duration = self.finish(request, response, started)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response.streaming_content, counter
+            )
+            return response
+        sample = self.sample(request, counter, len(response.content))
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={counter.time * 1000:.1f};'
+            f'desc="{counter.queries} queries"',
+            f'serialization;dur={sample["serialization"] * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ))
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        request._metrics_serialization = 0.0
+        response = await self.get_response(request)
+        self.finish(request, response, started)
+        return response
+
+    def stream(self, request, content, counter):
+        """
+        Потоковый ответ формируется после выхода из middleware:
+        запросы и время чтения потока учитываются по мере отдачи.
+        Заголовки уже отправлены, поэтому Server-Timing не добавляется.
+        """
+        size = 0
+        started, db_time = time.perf_counter(), counter.time
+        with count_queries(counter):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        request._metrics_serialization += (
+            time.perf_counter() - started - (counter.time - db_time)
+        )
+        self.sample(request, counter, size)
+
+    def sample(self, request, counter, size):
+        sample = {
+            'queries': counter.queries,
+            'db': counter.time,
+            'serialization': request._metrics_serialization,
+            'size': size,
+        }
+        registry.observe_sample(view_name(request), sample)
+        return sample
+
+    def finish(self, request, response, started):
+        duration = time.perf_counter() - started
+        registry.observe(
+            view_name(request),
+            request.method,
+            response.status_code,
+            duration,
+        )
+        return duration
+
+    def process_template_response(self, request, response):
+        render = response.render
+
+        def timed_render():
+            started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                request._metrics_serialization += (
+                    time.perf_counter() - started
+                )
+        response.render = timed_render
+        return response
+
+
+def is_internal(request):
+    """
+    Запрос пришел напрямую из локальной или частной сети,
+    а не через прокси с внешним адресом клиента.
+    """
+    if 'HTTP_X_FORWARDED_FOR' in request.META:
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return address.is_loopback or address.is_private
+
+
+def metrics(request):
+    """
+    Метрики процесса в формате Prometheus. Если задан METRICS_TOKEN,
+    нужен заголовок Authorization: Bearer <токен>, иначе метрики
+    отдаются только на внутренние запросы.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+        )
+    else:
+        allowed = is_internal(request)
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -41,6 +41,67 @@ DJOSER = {
 
     "HIDE_USERS": False,
 }
+
+# Время жизни кэша связей пользователя (избранное, покупки, подписки)
+# между запросами, в секундах. 0 - загружать связи в каждом запросе.
+VIEWER_RELATIONS_CACHE_TIMEOUT = int(
+    os.getenv('VIEWER_RELATIONS_CACHE_TIMEOUT', default=0)
+)
+
+# Автодополнение ингредиентов: индекс в памяти процесса (True)
+# или поиск в базе по триграммному индексу (False)
+INGREDIENTS_AUTOCOMPLETE_INDEX = os.getenv(
+    'INGREDIENTS_AUTOCOMPLETE_INDEX', default='True'
+) == 'True'
+INGREDIENTS_AUTOCOMPLETE_LIMIT = int(
+    os.getenv('INGREDIENTS_AUTOCOMPLETE_LIMIT', default=20)
+)
+
+# Время кэширования справочников (теги, ингредиенты) на клиенте, в секундах
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', default=60))
+
+# Оценка числа записей по статистике PostgreSQL вместо COUNT(*)
+# для списков без фильтров в таблицах больше порога
+PAGINATION_APPROXIMATE_COUNT = os.getenv(
+    'PAGINATION_APPROXIMATE_COUNT', default='False'
+) == 'True'
+PAGINATION_APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('PAGINATION_APPROXIMATE_COUNT_THRESHOLD', default=100000)
+)
+
+# Число подписчиков, начиная с которого рецепты автора не записываются
+# в ленты подписчиков, а выбираются при запросе ленты
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=1000))
+
+# Ширина уменьшенных копий изображений рецептов и число процессов,
+# которые их создают. 0 - создавать копии в самом запросе.
+IMAGE_VARIANT_WIDTHS = (320, 640)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+# Ограничения загрузки изображений рецептов. Файлы больше
+# FILE_UPLOAD_MAX_MEMORY_SIZE записываются во временный файл по частям.
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_MAX_PIXELS', default=25_000_000)
+)
+# Предел тела запроса с рецептом: изображение в base64 и остальные поля.
+# client_max_body_size в infra/nginx.conf должен быть не меньше.
+RECIPE_UPLOAD_MAX_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 64 * 1024
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Доля запросов, для которых считаются SQL-запросы, время рендеринга
+# и размер ответа (заголовок Server-Timing). Число и время запросов
+# по вьюсетам учитываются всегда и отдаются на /metrics.
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', default=0.1))
+# Токен доступа к /metrics. Без токена метрики отдаются только на запросы
+# из локальной или частной сети без заголовка X-Forwarded-For.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+# Асинхронные представления для чтения рецептов, тегов и ингредиентов.
+# Включается при запуске под ASGI (uvicorn), под WSGI не дает выигрыша.
+ASYNC_READ_API = os.getenv('ASYNC_READ_API', default='False') == 'True'
 # Application definition
 
 INSTALLED_APPS = [
@@ -63,6 +124,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
+    'foodgram.db.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,15 +159,39 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Соединения с PostgreSQL:
+# CONN_MAX_AGE - сколько секунд держать соединение открытым между
+# запросами (0 - закрывать после каждого запроса, без пула постоянные
+# соединения включаются переменной, например CONN_MAX_AGE=60);
+# CONN_HEALTH_CHECKS - проверять такое соединение перед использованием;
+# DB_POOL_SIZE - пул соединений процесса (0 - без пула), с пулом
+# соединение возвращается в пул в конце запроса, поэтому CONN_MAX_AGE
+# лучше оставить 0; DB_POOL_TIMEOUT - ожидание свободного соединения;
+# DB_PGBOUNCER - база за PgBouncer в режиме transaction: без курсоров
+# на сервере, которые не переживают смену соединения между транзакциями.
+CONN_MAX_AGE = int(os.getenv('CONN_MAX_AGE', default=0))
+CONN_HEALTH_CHECKS = os.getenv('CONN_HEALTH_CHECKS', default='True') == 'True'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', default=0))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', default=10))
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', default='False') == 'True'
+
 if POSTGRESQL:
+    ENGINE = os.getenv('DB_ENGINE', default='django.db.backends.postgresql')
+    if ENGINE.startswith('django.db.backends.postgresql'):
+        ENGINE = 'foodgram.db.postgresql'
     DATABASES = {
         'default': {
-            'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+            'ENGINE': ENGINE,
             'NAME': os.getenv('DB_NAME', default='postgres'),
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default='5432')
+            'PORT': os.getenv('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': CONN_HEALTH_CHECKS,
+            'POOL_SIZE': DB_POOL_SIZE,
+            'POOL_TIMEOUT': DB_POOL_TIMEOUT,
+            'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
         }
     }
 else:
@@ -115,6 +202,63 @@ else:
         }
     }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=host1:5432,host2 с теми же
+# учетными данными и настройками соединений, что у основной базы.
+# В тестах реплики указывают на основную базу.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(',')),
+    start=1,
+):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default'].get('PORT', ''),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# Чтение в GET-запросах идет из реплик. После изменяющего запроса
+# клиент REPLICA_STICKY_SECONDS секунд читает из основной базы.
+DATABASE_ROUTERS = ['foodgram.db.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(
+    os.getenv('REPLICA_STICKY_SECONDS', default=10)
+)
+
+
+# Cache
+# Версии справочников и кэши связей хранятся здесь. При нескольких
+# процессах gunicorn нужен общий для них бэкенд (memcached, файловый).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    # Кэш ответов: локальная память, файловый
+    # (django.core.cache.backends.filebased.FileBasedCache, каталог)
+    # или Redis (django_redis.cache.RedisCache, redis://host:6379/1)
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', default='responses'),
+    },
+}
+
+# Время жизни ответов списка рецептов для анонимных пользователей
+# в кэше responses, в секундах. 0 - без кэша. Изменение рецептов и тегов
+# сбрасывает кэш сразу, счетчики и данные авторов - по истечении времени.
+RECIPE_LIST_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_LIST_CACHE_TIMEOUT', default=0)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -32,6 +32,7 @@ class RecipesAdmin(admin.ModelAdmin):
         'author',
         'name',
         'get_tags',
+        'favorites_count',
     )
     list_filter = (
         'author',
@@ -1,7 +1,28 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        from .catalog import bump_catalog_version
+        from .models import Ingredients, RecipeIngredients, Recipes, Tags
+        from .pantry import delete_pantry_entry
+        from .search import (create_search_indexes, delete_search_entry,
+                             ingredient_saved, recipe_saved)
+
+        for model in (Ingredients, Tags):
+            post_save.connect(bump_catalog_version, sender=model)
+            post_delete.connect(bump_catalog_version, sender=model)
+        # Поисковый индекс поддерживается сигналами, поэтому рецепты
+        # из админки тоже находятся. Удаление ингредиента рецепта
+        # сопровождается сохранением рецепта и отдельно не отслеживается.
+        for model in (Recipes, RecipeIngredients):
+            post_save.connect(recipe_saved, sender=model)
+        post_save.connect(ingredient_saved, sender=Ingredients)
+        post_delete.connect(delete_search_entry, sender=Recipes)
+        post_delete.connect(delete_pantry_entry, sender=Recipes)
+        post_migrate.connect(create_search_indexes, sender=self)
@@ -0,0 +1,55 @@
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+from .models import DataVersion
+
+VERSION_KEY = 'catalog_version:{}'
+
+
+def new_version():
+    return time.time_ns()
+
+
+def get_version(name, backend=cache):
+    """Версия набора данных name, хранится в кэше backend без срока"""
+    return backend.get_or_set(VERSION_KEY.format(name), new_version, None)
+
+
+def bump_version(name, backend=cache):
+    key = VERSION_KEY.format(name)
+    try:
+        backend.incr(key)
+    except ValueError:
+        backend.set(key, new_version(), None)
+
+
+def get_catalog_version(model):
+    """
+    Версия справочника, меняется при каждом изменении его записей.
+    Хранится в основной базе: ее меняют и команды управления,
+    а реплика может еще не знать об изменении.
+    """
+    version = DataVersion.objects.using(DEFAULT_DB_ALIAS).filter(
+        name=model._meta.label_lower
+    ).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_catalog_version(sender, **kwargs):
+    """
+    Обработчик сигналов сохранения и удаления записей справочника.
+    Версия меняется в той же транзакции, что и записи, поэтому
+    запрос не увидит новую версию раньше новых данных.
+    """
+    name = sender._meta.label_lower
+    updated = DataVersion.objects.filter(name=name).update(
+        version=F('version') + 1
+    )
+    if not updated:
+        DataVersion.objects.get_or_create(name=name)
+        DataVersion.objects.filter(name=name).update(
+            version=F('version') + 1
+        )
@@ -0,0 +1,136 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {
+    'avif': 'AVIF',
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+
+def supported_formats():
+    """Форматы вариантов, которые умеет сохранять установленный Pillow"""
+    extensions = Image.registered_extensions()
+    return tuple(
+        extension for extension in VARIANT_FORMATS
+        if f'.{extension}' in extensions
+    )
+
+
+def render_variants(root, name, widths, formats):
+    """
+    Уменьшенные копии изображения рядом с оригиналом.
+    Выполняется в отдельном процессе, поэтому не обращается к Django.
+    Возвращает {формат: {ширина: имя файла}}.
+    """
+    stem, _ = os.path.splitext(name)
+    variants = {}
+    with Image.open(os.path.join(root, name)) as original:
+        # Снимки с телефонов хранят поворот в EXIF, варианты его не несут
+        image = ImageOps.exif_transpose(original)
+        targets = [width for width in widths if width < image.width]
+        for width in targets or [image.width]:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            for extension in formats:
+                frame = resized
+                if extension == 'jpeg' and frame.mode != 'RGB':
+                    frame = frame.convert('RGB')
+                variant = f'{stem}_{width}.{extension}'
+                frame.save(
+                    os.path.join(root, variant),
+                    VARIANT_FORMATS[extension],
+                    quality=80,
+                )
+                variants.setdefault(extension, {})[str(width)] = variant
+    return variants
+
+
+@lru_cache(maxsize=1)
+def get_process_pool():
+    """
+    Пул процессов запускается через spawn: fork многопоточного
+    веб-процесса копирует занятые другими потоками блокировки
+    (логирование, драйвер базы, Pillow), и дочерний процесс зависает.
+    """
+    return ProcessPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_thread_pool():
+    return ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+
+
+def variant_arguments(name):
+    return (
+        settings.MEDIA_ROOT,
+        name,
+        settings.IMAGE_VARIANT_WIDTHS,
+        supported_formats(),
+    )
+
+
+def store_variants(recipe_id, name, variants):
+    from .models import Recipes
+
+    Recipes.objects.filter(
+        id=recipe_id, image=name
+    ).update(image_variants=variants)
+
+
+def process_variants(recipe_id, name):
+    """Обработка изображения в пуле процессов с сохранением результата"""
+    try:
+        variants = get_process_pool().submit(
+            render_variants, *variant_arguments(name)
+        ).result()
+        store_variants(recipe_id, name, variants)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe):
+    """
+    Создание вариантов изображения рецепта после фиксации транзакции.
+    При IMAGE_WORKERS = 0 изображение обрабатывается в самом запросе.
+    """
+    recipe_id, name = recipe.id, recipe.image.name
+    if not settings.IMAGE_WORKERS:
+        transaction.on_commit(lambda: store_variants(
+            recipe_id, name, render_variants(*variant_arguments(name))
+        ))
+        return
+    transaction.on_commit(
+        lambda: get_thread_pool().submit(process_variants, recipe_id, name)
+    )
+
+
+def delete_variants(variants):
+    """
+    Удаление файлов вариантов замененного изображения
+    после фиксации транзакции.
+    """
+    names = [
+        name for sizes in variants.values() for name in sizes.values()
+    ]
+
+    def delete():
+        for name in names:
+            default_storage.delete(name)
+    if names:
+        transaction.on_commit(delete)
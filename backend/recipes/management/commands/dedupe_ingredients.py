@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from recipes.models import Ingredients, RecipeIngredients
+from recipes.pantry import recipe_changed
+from social.models import ShoppingCartTotals
+
+MERGED = (
+    (RecipeIngredients, 'recipe_id'),
+    (ShoppingCartTotals, 'user_id'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        ' Объединить ингредиенты с одинаковыми названием и единицей '
+        'измерения. Выполняется перед добавлением ограничения '
+        'unique_ingredient в существующую базу '
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только вывести найденные дубликаты',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        groups = Ingredients.objects.values(
+            'name', 'measurement_unit'
+        ).annotate(
+            total=Count('id')
+        ).filter(total__gt=1).order_by('name', 'measurement_unit')
+        merged = 0
+        with transaction.atomic():
+            for group in groups:
+                ids = sorted(Ingredients.objects.filter(
+                    name=group['name'],
+                    measurement_unit=group['measurement_unit'],
+                ).values_list('id', flat=True))
+                self.stdout.write(
+                    f'{group["name"]}, {group["measurement_unit"]}: '
+                    f'{ids[0]} <- {ids[1:]}'
+                )
+                if not options['dry_run']:
+                    self.merge(ids[0], ids[1:])
+                merged += len(ids) - 1
+        self.stdout.write(self.style.SUCCESS(f'Дубликатов: {merged}'))
+
+    def merge(self, keep, duplicates):
+        """
+        Перенос ссылок с дубликатов на ингредиент keep.
+        Если у рецепта или пользователя уже есть обе записи,
+        количества складываются в одну.
+        """
+        for model, owner in MERGED:
+            rows = defaultdict(list)
+            for row in model.objects.filter(
+                ingredient_id__in=[keep, *duplicates]
+            ).order_by('id'):
+                rows[getattr(row, owner)].append(row)
+            updated, deleted = [], []
+            for owner_rows in rows.values():
+                row, *rest = owner_rows
+                row.ingredient_id = keep
+                row.amount = sum(item.amount for item in owner_rows)
+                updated.append(row)
+                deleted.extend(item.id for item in rest)
+            model.objects.filter(id__in=deleted).delete()
+            model.objects.bulk_update(updated, ('ingredient', 'amount'))
+            if model is RecipeIngredients:
+                for recipe_id in rows:
+                    recipe_changed(recipe_id)
+        Ingredients.objects.filter(id__in=duplicates).delete()
@@ -0,0 +1,363 @@
+import csv
+import io
+import itertools
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from recipes.catalog import bump_catalog_version
+from recipes.models import Ingredients, RecipeIngredients, Recipes, Tags
+from recipes.pantry import reset_pantry_index
+from social.feed import rebuild_timelines
+from social.models import FavoritesList, FollowsList, ShoppingList
+from users.models import User
+
+PREFIX = 'fixture_'
+BATCH_SIZE = 5000
+CHUNK_SIZE = 1000
+
+# Данные, общие для всех задач процесса: id пользователей и рецептов
+# в порядке популярности, параметры распределения
+WORKER = {}
+
+
+@lru_cache(maxsize=4)
+def zipf_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для рангов 1..size"""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def zipf_sample(rng, population, exponent, count, exclude=None):
+    """count различных элементов, чаще из начала population"""
+    count = min(count, len(population) - (exclude is not None))
+    if count > len(population) // 2:
+        return sorted(rng.sample(
+            [item for item in population if item != exclude], count
+        ))
+    weights = zipf_weights(len(population), exponent)
+    chosen = set()
+    while len(chosen) < count:
+        item = rng.choices(population, cum_weights=weights)[0]
+        if item != exclude:
+            chosen.add(item)
+    return sorted(chosen)
+
+
+def spread(rng, mean):
+    """Случайное число со средним mean"""
+    return rng.randint(0, 2 * mean) if mean else 0
+
+
+def init_worker(state):
+    django.setup()
+    WORKER.update(state)
+
+
+def insert(model, fields, rows):
+    """
+    Запись строк (кортежей значений полей fields): COPY в PostgreSQL,
+    bulk_create пачками в остальных базах.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    fields = [model._meta.get_field(field) for field in fields]
+    if connection.vendor == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        columns = ', '.join(field.column for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {model._meta.db_table} ({columns}) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+        return len(rows)
+    model.objects.using(using).bulk_create(
+        [
+            model(**{
+                field.attname: value for field, value in zip(fields, row)
+            })
+            for row in rows
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return len(rows)
+
+
+def generate_recipes(start, stop):
+    """Ингредиенты и теги рецептов с номерами start..stop"""
+    rng = random.Random(f'{WORKER["seed"]}:recipes:{start}')
+    ingredients, tags = [], []
+    for recipe_id in WORKER['recipe_ids'][start:stop]:
+        count = max(1, spread(rng, WORKER['recipe_ingredients']))
+        for ingredient_id in rng.sample(
+            WORKER['ingredient_ids'],
+            min(count, len(WORKER['ingredient_ids'])),
+        ):
+            ingredients.append(
+                (recipe_id, ingredient_id, rng.randint(1, 500))
+            )
+        for tag_id in rng.sample(
+            WORKER['tag_ids'], rng.randint(1, min(3, len(WORKER['tag_ids'])))
+        ):
+            tags.append((recipe_id, tag_id))
+    with transaction.atomic():
+        insert(
+            RecipeIngredients, ('recipe', 'ingredient', 'amount'),
+            ingredients,
+        )
+        insert(Recipes.tags.through, ('recipes', 'tags'), tags)
+    return {'RecipeIngredients': len(ingredients)}
+
+
+def generate_users(start, stop):
+    """Подписки, избранное и списки покупок пользователей start..stop"""
+    rng = random.Random(f'{WORKER["seed"]}:users:{start}')
+    exponent = WORKER['zipf']
+    follows, favorites, shopping = [], [], []
+    for user_id in WORKER['user_ids'][start:stop]:
+        follows += [
+            (user_id, author_id) for author_id in zipf_sample(
+                rng, WORKER['user_ids'], exponent,
+                spread(rng, WORKER['follows']), exclude=user_id,
+            )
+        ]
+        for rows, mean in ((favorites, 'favorites'), (shopping, 'cart')):
+            rows += [
+                (user_id, recipe_id) for recipe_id in zipf_sample(
+                    rng, WORKER['recipe_ids'], exponent,
+                    spread(rng, WORKER[mean]),
+                )
+            ]
+    with transaction.atomic():
+        insert(FollowsList, ('user', 'author'), follows)
+        insert(FavoritesList, ('user', 'recipe'), favorites)
+        insert(ShoppingList, ('user', 'recipe'), shopping)
+    return {
+        'FollowsList': len(follows),
+        'FavoritesList': len(favorites),
+        'ShoppingList': len(shopping),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        ' Синтетические данные для нагрузочного тестирования. '
+        'Популярность авторов и рецептов распределена по закону Ципфа, '
+        'при одном seed данные совпадают при любом числе процессов '
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument(
+            '--recipe-ingredients',
+            type=int,
+            default=8,
+            help='Среднее число ингредиентов в рецепте',
+        )
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=30,
+            help='Среднее число рецептов в избранном',
+        )
+        parser.add_argument(
+            '--cart',
+            type=int,
+            default=5,
+            help='Среднее число рецептов в списке покупок',
+        )
+        parser.add_argument(
+            '--zipf',
+            type=float,
+            default=1.1,
+            help='Показатель распределения популярности',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Число процессов, для SQLite всегда 1',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить данные, созданные этой командой ранее',
+        )
+        parser.add_argument(
+            '--search-index',
+            action='store_true',
+            help='Пересобрать поисковый индекс (по запросу на рецепт)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        started = time.perf_counter()
+        if options['clear']:
+            User.objects.filter(username__startswith=PREFIX).delete()
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(
+                'Данные уже сгенерированы, используйте --clear'
+            )
+        rng = random.Random(options['seed'])
+        state = {
+            'seed': options['seed'],
+            'zipf': options['zipf'],
+            'recipe_ingredients': options['recipe_ingredients'],
+            'follows': options['follows'],
+            'favorites': options['favorites'],
+            'cart': options['cart'],
+            'user_ids': self.create_users(options['users'], rng),
+            'ingredient_ids': self.ingredient_ids(),
+            'tag_ids': self.tag_ids(),
+        }
+        state['recipe_ids'] = self.create_recipes(
+            options['recipes'], state['user_ids'], options['zipf'], rng
+        )
+        counts = self.run_tasks(state, options['workers'])
+        self.stdout.write(
+            f'Пользователей {len(state["user_ids"])}, '
+            f'рецептов {len(state["recipe_ids"])}, '
+            + ', '.join(f'{name} {count}' for name, count in counts.items())
+            + f' за {time.perf_counter() - started:.1f} с'
+        )
+        self.rebuild_derived(options['search_index'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def create_users(self, count, rng):
+        """
+        Пользователи в случайном порядке популярности: чем раньше id
+        в возвращаемом списке, тем чаще пользователь выбирается автором.
+        """
+        password = User(username='hash')
+        password.set_password(PREFIX)
+        for start in range(0, count, BATCH_SIZE):
+            User.objects.bulk_create([
+                User(
+                    username=f'{PREFIX}{number}',
+                    email=f'{PREFIX}{number}@example.ru',
+                    first_name='Fixture',
+                    last_name=str(number),
+                    password=password.password,
+                )
+                for number in range(start, min(start + BATCH_SIZE, count))
+            ])
+        user_ids = list(User.objects.filter(
+            username__startswith=PREFIX
+        ).order_by('id').values_list('id', flat=True))
+        rng.shuffle(user_ids)
+        return user_ids
+
+    def ingredient_ids(self):
+        if not Ingredients.objects.exists():
+            call_command('load_data', stdout=io.StringIO())
+        ingredient_ids = list(Ingredients.objects.order_by(
+            'id'
+        ).values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Нет ингредиентов, загрузите load_data')
+        return ingredient_ids
+
+    def tag_ids(self):
+        if not Tags.objects.exists():
+            Tags.objects.bulk_create([
+                Tags(name=f'{PREFIX}{number}', color=f'#00{number:02d}00',
+                     slug=f'{PREFIX}{number}')
+                for number in range(5)
+            ])
+        return list(Tags.objects.order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, count, user_ids, exponent, rng):
+        """
+        Рецепты авторов по закону Ципфа. Возвращает id рецептов
+        в порядке популярности их авторов.
+        """
+        weights = zipf_weights(len(user_ids), exponent)
+        authors = rng.choices(user_ids, cum_weights=weights, k=count)
+        for start in range(0, count, BATCH_SIZE):
+            Recipes.objects.bulk_create([
+                Recipes(
+                    author_id=author_id,
+                    name=f'Рецепт {start + number}',
+                    text=f'Описание рецепта {start + number}',
+                    cooking_time=rng.randint(5, 180),
+                    image='recipes/fixture.png',
+                )
+                for number, author_id in enumerate(
+                    authors[start:start + BATCH_SIZE]
+                )
+            ])
+        rank = {
+            user_id: position for position, user_id in enumerate(user_ids)
+        }
+        recipes = Recipes.objects.filter(
+            author__username__startswith=PREFIX
+        ).order_by('id').values_list('id', 'author_id')
+        return [
+            recipe_id for recipe_id, author_id in sorted(
+                recipes, key=lambda recipe: (rank[recipe[1]], recipe[0])
+            )
+        ]
+
+    def run_tasks(self, state, workers):
+        """Связи пачками по CHUNK_SIZE, при workers > 1 в пуле процессов"""
+        tasks = [
+            (generate_recipes, start, start + CHUNK_SIZE)
+            for start in range(0, len(state['recipe_ids']), CHUNK_SIZE)
+        ] + [
+            (generate_users, start, start + CHUNK_SIZE)
+            for start in range(0, len(state['user_ids']), CHUNK_SIZE)
+        ]
+        if connections[router.db_for_write(Recipes)].vendor == 'sqlite':
+            workers = 1
+        counts = {}
+        if workers > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(state,),
+            ) as pool:
+                results = [
+                    pool.submit(function, start, stop)
+                    for function, start, stop in tasks
+                ]
+                results = [future.result() for future in results]
+        else:
+            WORKER.update(state)
+            results = [
+                function(start, stop) for function, start, stop in tasks
+            ]
+        for result in results:
+            for name, count in result.items():
+                counts[name] = counts.get(name, 0) + count
+        return counts
+
+    def rebuild_derived(self, search_index):
+        """Сводные списки покупок, счетчики, ленты и поисковый индекс"""
+        quiet = io.StringIO()
+        call_command('reconcile_counters', stdout=quiet)
+        call_command('rebuild_shopping_totals', stdout=quiet)
+        rebuild_timelines()
+        reset_pantry_index()
+        bump_catalog_version(Tags)
+        if search_index:
+            call_command('rebuild_search_index', stdout=quiet)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from recipes.images import render_variants, store_variants, variant_arguments
+from recipes.models import Recipes
+
+
+class Command(BaseCommand):
+    help = ' Создать уменьшенные копии изображений рецептов '
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для уже обработанных рецептов',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        recipes = Recipes.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        for recipe_id, name in recipes.values_list('id', 'image').iterator():
+            try:
+                variants = render_variants(*variant_arguments(name))
+            except OSError as error:
+                self.stdout.write(self.style.ERROR(f'{name}: {error}'))
+                continue
+            store_variants(recipe_id, name, variants)
+        self.stdout.write(self.style.SUCCESS('Изображения обработаны'))
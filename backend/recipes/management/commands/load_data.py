@@ -1,24 +1,143 @@
+import csv
 import json
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.catalog import bump_catalog_version
 from recipes.models import Ingredients, Tags
 
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+MODELS = {
+    'ingredients': (
+        Ingredients, ('name', 'measurement_unit'), ('name', 'measurement_unit')
+    ),
+    'tags': (Tags, ('name', 'color', 'slug'), ('slug',)),
+}
+
+
+def iter_json(file):
+    """
+    Объекты из JSON-массива по мере чтения файла,
+    без загрузки всего файла в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив объектов')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON')
+            buffer += chunk
+            continue
+        yield row
+        buffer = buffer[end:]
+
+
+def iter_csv(file, fields):
+    """Строки CSV без заголовка с полями в порядке fields"""
+    for number, values in enumerate(csv.reader(file), start=1):
+        if not values:
+            continue
+        if len(values) != len(fields):
+            raise CommandError(
+                f'Строка {number}: ожидается полей {len(fields)}'
+            )
+        yield dict(zip(fields, values))
+
 
 class Command(BaseCommand):
-    help = ' Загрузить данные в модель ингредиентов '
+    help = ' Загрузить ингредиенты и теги из JSON или CSV '
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files',
+            nargs='*',
+            default=['data/ingredients.csv', 'data/tags.json'],
+            help='Файлы JSON или CSV, по умолчанию data/ingredients.csv '
+                 'и data/tags.json',
+        )
+        parser.add_argument(
+            '--model',
+            choices=MODELS,
+            help='Модель для всех файлов, по умолчанию по имени файла',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING('Старт команды'))
-        with open('data/ingredients.json', encoding='utf-8',
-                  ) as data_file_ingredients:
-            ingredient_data = json.loads(data_file_ingredients.read())
-            for ingredients in ingredient_data:
-                Ingredients.objects.get_or_create(**ingredients)
-
-        with open('data/tags.json', encoding='utf-8',
-                  ) as data_file_tags:
-            tags_data = json.loads(data_file_tags.read())
-            for tags in tags_data:
-                Tags.objects.get_or_create(**tags)
-
+        for path in options['files']:
+            if not os.path.exists(path):
+                self.stdout.write(
+                    self.style.WARNING(f'Файл {path} не найден, пропущен')
+                )
+                continue
+            name = options['model'] or next((
+                name for name in MODELS
+                if os.path.basename(path).startswith(name)
+            ), None)
+            if name is None:
+                raise CommandError(f'Не удалось определить модель для {path}')
+            self.load(path, *MODELS[name])
         self.stdout.write(self.style.SUCCESS('Данные загружены'))
+
+    def read(self, path, fields):
+        with open(path, encoding='utf-8', newline='') as file:
+            if path.endswith('.json'):
+                yield from iter_json(file)
+            elif path.endswith('.csv'):
+                yield from iter_csv(file, fields)
+            else:
+                raise CommandError(f'Неизвестный формат файла {path}')
+
+    def load(self, path, model, fields, key_fields):
+        """
+        Загрузка файла пачками по BATCH_SIZE в одной транзакции.
+        Записи, которые уже есть в базе или в файле, пропускаются,
+        поэтому повторный запуск ничего не меняет.
+        """
+        started = time.perf_counter()
+        seen = set(model.objects.values_list(*key_fields))
+        read = 0
+        batch = []
+        with transaction.atomic():
+            # Число добавленных записей считается по таблице: bulk_create
+            # с ignore_conflicts не сообщает, какие записи пропущены
+            before = model.objects.count()
+            for row in self.read(path, fields):
+                read += 1
+                try:
+                    row = {field: str(row[field]).strip() for field in fields}
+                except KeyError as error:
+                    raise CommandError(f'Запись {read}: нет поля {error}')
+                key = tuple(row[field] for field in key_fields)
+                if key in seen:
+                    continue
+                seen.add(key)
+                batch.append(model(**row))
+                if len(batch) >= BATCH_SIZE:
+                    model.objects.bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created = model.objects.count() - before
+            if created:
+                bump_catalog_version(model)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{path}: прочитано {read}, добавлено {created} '
+            f'за {elapsed:.3f} с ({read / elapsed:.0f} строк/с)'
+        )
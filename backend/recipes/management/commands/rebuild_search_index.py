@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipes
+from recipes.search import create_search_indexes, update_search_vector
+
+
+class Command(BaseCommand):
+    help = ' Пересобрать поисковый индекс рецептов '
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        create_search_indexes()
+        for recipe_id in Recipes.objects.values_list(
+            'id', flat=True
+        ).iterator():
+            update_search_vector(recipe_id)
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
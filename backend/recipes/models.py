@@ -1,4 +1,5 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
 from django.db import models
@@ -60,6 +61,12 @@ class Ingredients(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Игнредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit',),
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self) -> str:
         return f'{self.name}, {self.measurement_unit}'
@@ -81,6 +88,12 @@ class Recipes(models.Model):
         upload_to='recipes/',
         verbose_name='Изображение',
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Варианты изображения',
+    )
     text = models.TextField(
         verbose_name='Описание',
     )
@@ -110,9 +123,34 @@ class Recipes(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    shopping_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipes_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipes_popular_idx'
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -159,3 +197,42 @@ class RecipeIngredients(models.Model):
             f'{self.ingredient.name} :: {self.ingredient.measurement_unit}'
             f' - {self.amount}'
         )
+
+
+class DataVersion(models.Model):
+    """
+    Модель версии набора данных. Хранится в базе, поэтому изменение
+    из любого процесса, в том числе из команд управления, видят все
+    процессы приложения.
+    """
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Набор данных',
+    )
+    version = models.BigIntegerField(
+        default=0,
+        verbose_name='Версия',
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class PantryChange(models.Model):
+    """
+    Модель журнала изменений ингредиентов рецептов для индекса
+    подбора по продуктам. Пустой рецепт означает полную перезагрузку.
+    """
+    recipe_id = models.BigIntegerField(
+        null=True,
+        verbose_name='Рецепт',
+    )
+
+    class Meta:
+        verbose_name = 'Изменение индекса продуктов'
+        verbose_name_plural = 'Изменения индекса продуктов'
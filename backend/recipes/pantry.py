@@ -0,0 +1,142 @@
+import threading
+from collections import Counter, defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+
+from .models import PantryChange, RecipeIngredients
+
+# Сколько изменений применяется по одному; при большем числе, пропусках
+# в журнале или отметке о массовой записи индекс загружается заново.
+# Журнал хранит последние CHANGE_LOG_SIZE записей.
+CHANGE_LOG_SIZE = 100
+
+
+class PantryIndex:
+    """
+    Обратный индекс «ингредиент -> рецепты» и число ингредиентов
+    каждого рецепта. Подбор рецептов по набору продуктов сводится
+    к пересечению разреженных множеств без запросов к базе.
+    Индекс меняется и читается только под lock.
+    """
+    def __init__(self):
+        self.version = None
+        self.recipes = defaultdict(set)
+        self.ingredients = {}
+        self.lock = threading.Lock()
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        for ingredient_id in self.ingredients.pop(recipe_id, ()):
+            self.recipes[ingredient_id].discard(recipe_id)
+        if ingredient_ids:
+            self.ingredients[recipe_id] = frozenset(ingredient_ids)
+            for ingredient_id in ingredient_ids:
+                self.recipes[ingredient_id].add(recipe_id)
+
+    def load(self, recipe_ids=None):
+        """
+        Загрузка всех рецептов или только изменившихся.
+        Изменения читаются из основной базы, реплика может отставать.
+        """
+        rows = RecipeIngredients.objects.using(DEFAULT_DB_ALIAS).order_by()
+        if recipe_ids is None:
+            self.recipes.clear()
+            self.ingredients.clear()
+        else:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        loaded = defaultdict(set)
+        for recipe_id, ingredient_id in rows.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator():
+            loaded[recipe_id].add(ingredient_id)
+        for recipe_id in recipe_ids or loaded:
+            self.set_recipe(recipe_id, loaded.get(recipe_id))
+
+    def reload(self):
+        """
+        Полная загрузка. Версия читается до данных: изменения,
+        записанные во время загрузки, применятся при следующей проверке.
+        """
+        self.version = PantryChange.objects.using(
+            DEFAULT_DB_ALIAS
+        ).aggregate(version=Max('id'))['version'] or 0
+        self.load()
+
+    def refresh(self):
+        """
+        Применение новых записей журнала изменений из основной базы.
+        Журнал общий для всех процессов, включая команды управления.
+        """
+        version = self.version
+        changes = None
+        if version is not None:
+            changes = list(PantryChange.objects.using(
+                DEFAULT_DB_ALIAS
+            ).filter(id__gt=version).order_by('id').values_list(
+                'id', 'recipe_id'
+            )[:CHANGE_LOG_SIZE])
+            if not changes:
+                return
+        with self.lock:
+            if self.version != version:
+                return
+            if changes is None or not self.is_continuous(version, changes):
+                self.reload()
+                return
+            self.load({recipe_id for _, recipe_id in changes})
+            self.version = changes[-1][0]
+
+    @staticmethod
+    def is_continuous(version, changes):
+        """Изменения идут подряд за version и не требуют полной загрузки"""
+        return (
+            len(changes) < CHANGE_LOG_SIZE
+            and changes[-1][0] - version == len(changes)
+            and all(recipe_id is not None for _, recipe_id in changes)
+        )
+
+    def match(self, ingredient_ids):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов,
+        по убыванию доли имеющихся ингредиентов: [(recipe_id, coverage)].
+        """
+        self.refresh()
+        # refresh в другом потоке меняет множества на месте, поэтому
+        # чтение идет под той же блокировкой. Подбор выполняется в памяти
+        # и из-за GIL все равно не шел бы параллельно.
+        with self.lock:
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self.recipes.get(ingredient_id, ()))
+            ranked = [
+                (recipe_id, count / len(self.ingredients[recipe_id]), count)
+                for recipe_id, count in matched.items()
+            ]
+        ranked.sort(key=lambda item: (item[1], item[2], item[0]), reverse=True)
+        return [(recipe_id, coverage) for recipe_id, coverage, _ in ranked]
+
+
+pantry_index = PantryIndex()
+
+
+def log_change(recipe_id):
+    change = PantryChange.objects.create(recipe_id=recipe_id)
+    if change.id % CHANGE_LOG_SIZE == 0:
+        PantryChange.objects.filter(
+            id__lte=change.id - CHANGE_LOG_SIZE
+        ).delete()
+
+
+def recipe_changed(recipe_id):
+    """Запись об изменении ингредиентов рецепта после фиксации транзакции"""
+    transaction.on_commit(lambda: log_change(recipe_id))
+
+
+def reset_pantry_index():
+    """Полная перезагрузка индекса во всех процессах после массовых записей"""
+    transaction.on_commit(lambda: log_change(None))
+
+
+def delete_pantry_entry(sender, instance, **kwargs):
+    """Удаление рецепта из индекса продуктов"""
+    recipe_changed(instance.id)
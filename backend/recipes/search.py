@@ -0,0 +1,260 @@
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, When
+
+from .catalog import get_catalog_version
+from .models import Ingredients, RecipeIngredients, Recipes
+
+TRIGRAM_INDEX = 'recipes_ingredients_name_trgm'
+PREFIX_INDEX = 'recipes_ingredients_name_prefix'
+SEARCH_VECTOR_INDEX = 'recipes_recipes_search_vector'
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_search'
+
+# Рецепты, поисковый индекс которых обновляется после фиксации
+pending = threading.local()
+
+
+class IngredientIndex:
+    """
+    Неизменяемый индекс ингредиентов для автодополнения.
+    Ингредиенты отсортированы по названию, префикс ищется бинарным поиском,
+    совпадения по префиксу идут перед совпадениями по подстроке.
+    """
+    def __init__(self, ingredients, version=None):
+        self.version = version
+        self.ingredients = tuple(sorted(
+            ingredients,
+            key=lambda ingredient: (ingredient.name.lower(), ingredient.id),
+        ))
+        self.names = tuple(
+            ingredient.name.lower() for ingredient in self.ingredients
+        )
+
+    @classmethod
+    def build(cls, version=None):
+        """Индекс версии version по основной базе, а не по реплике"""
+        return cls(Ingredients.objects.using(DEFAULT_DB_ALIAS), version)
+
+    def search(self, query, limit):
+        query = query.lower()
+        result = []
+        position = bisect_left(self.names, query)
+        while (
+            len(result) < limit
+            and position < len(self.names)
+            and self.names[position].startswith(query)
+        ):
+            result.append(self.ingredients[position])
+            position += 1
+        for name, ingredient in zip(self.names, self.ingredients):
+            if len(result) >= limit:
+                break
+            if query in name and not name.startswith(query):
+                result.append(ingredient)
+        return result
+
+
+@lru_cache(maxsize=1)
+def build_ingredient_index(version):
+    return IngredientIndex.build(version)
+
+
+def get_ingredient_index(version=None):
+    """
+    Индекс текущей версии справочника, при изменении строится заново.
+    Версия общая для процессов, поэтому индекс обновляется и после
+    изменений из команд управления.
+    """
+    if version is None:
+        version = get_catalog_version(Ingredients)
+    return build_ingredient_index(version)
+
+
+def search_ingredients(name, limit):
+    """
+    Поиск ингредиентов в базе: сначала совпадения по началу названия
+    по префиксному индексу, затем, если их меньше limit, по подстроке.
+    """
+    ingredients = list(Ingredients.objects.filter(
+        name__istartswith=name
+    ).order_by('name', 'measurement_unit')[:limit])
+    if len(ingredients) < limit:
+        ingredients += Ingredients.objects.filter(
+            name__icontains=name
+        ).exclude(
+            name__istartswith=name
+        ).order_by('name', 'measurement_unit')[:limit - len(ingredients)]
+    return ingredients
+
+
+def autocomplete_ingredients(name, version=None):
+    """
+    Подсказки ингредиентов по индексу в памяти или по базе.
+    version - уже прочитанная версия справочника ингредиентов.
+    """
+    limit = settings.INGREDIENTS_AUTOCOMPLETE_LIMIT
+    if settings.INGREDIENTS_AUTOCOMPLETE_INDEX:
+        return get_ingredient_index(version).search(name, limit)
+    return search_ingredients(name, limit)
+
+
+def create_search_indexes(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Индексы поиска, которые нельзя описать в Meta моделей.
+    PostgreSQL: триграммный индекс по названию ингредиента для icontains,
+    B-tree с text_pattern_ops для istartswith (выражения совпадают с тем,
+    что строит Django) и GIN по search_vector рецептов.
+    SQLite: таблица FTS5 для рецептов.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} '
+                f'ON {Ingredients._meta.db_table} '
+                'USING gin ((UPPER("name"::text)) gin_trgm_ops)'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {PREFIX_INDEX} '
+                f'ON {Ingredients._meta.db_table} '
+                '((UPPER("name"::text)) text_pattern_ops)'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {SEARCH_VECTOR_INDEX} '
+                f'ON {Recipes._meta.db_table} USING gin (search_vector)'
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                'USING fts5(name, text, ingredients)'
+            )
+
+
+def update_search_vectors(recipe_ids):
+    """Обновление поискового индекса рецептов после записи ингредиентов"""
+    recipe_ids = list(recipe_ids)
+    connection = connections[router.db_for_write(Recipes)]
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.aggregates import StringAgg
+
+        names = RecipeIngredients.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', delimiter=' ')
+        ).values('names')
+        Recipes.objects.filter(id__in=recipe_ids).update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Subquery(names), weight='B', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+    elif connection.vendor == 'sqlite':
+        for recipe_id in recipe_ids:
+            update_fts_entry(connection, recipe_id)
+
+
+def update_fts_entry(connection, recipe_id):
+    recipe = Recipes.objects.filter(id=recipe_id).values(
+        'name', 'text'
+    ).first()
+    names = ' '.join(RecipeIngredients.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient__name', flat=True))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+        )
+        if recipe is not None:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients)'
+                ' VALUES (%s, %s, %s, %s)',
+                [recipe_id, recipe['name'], recipe['text'], names],
+            )
+
+
+def update_search_vector(recipe_id):
+    update_search_vectors([recipe_id])
+
+
+def update_pending_vectors():
+    recipe_ids = pending.__dict__.pop('recipe_ids', None)
+    if recipe_ids:
+        update_search_vectors(sorted(recipe_ids))
+
+
+def schedule_search_update(recipe_ids):
+    """
+    Обновление индекса рецептов после фиксации транзакции, когда
+    записаны и рецепт, и его ингредиенты. Каждый рецепт обновляется
+    один раз, сколько бы сигналов ни пришло в транзакции.
+    """
+    pending.__dict__.setdefault('recipe_ids', set()).update(recipe_ids)
+    transaction.on_commit(update_pending_vectors)
+
+
+def recipe_saved(sender, instance, **kwargs):
+    """
+    Обработчик сохранения рецепта или ингредиента рецепта,
+    в том числе из админки.
+    """
+    if sender is Recipes:
+        schedule_search_update([instance.id])
+    else:
+        schedule_search_update([instance.recipe_id])
+
+
+def ingredient_saved(sender, instance, created, **kwargs):
+    """Переименование ингредиента обновляет индекс рецептов с ним"""
+    if created:
+        return
+    schedule_search_update(RecipeIngredients.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True))
+
+
+def delete_search_entry(sender, instance, using, **kwargs):
+    """Удаление рецепта из таблицы FTS5"""
+    if connections[using].vendor == 'sqlite':
+        update_search_vector(instance.id)
+
+
+def fts_query(value):
+    """Запрос FTS5 из слов пользователя: каждое слово как префикс"""
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in value.split()
+    )
+
+
+def search_recipes(queryset, value):
+    """Рецепты, найденные по названию, описанию и ингредиентам, по рангу"""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
+    if connection.vendor == 'sqlite' and value.split():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0, 5.0)',
+                [fts_query(value)],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        return queryset.filter(id__in=ids).order_by(Case(
+            *[When(id=recipe_id, then=rank)
+              for rank, recipe_id in enumerate(ids)],
+            default=len(ids),
+        ))
+    return queryset.filter(
+        Q(name__icontains=value) | Q(text__icontains=value)
+    )
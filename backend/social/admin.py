@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import FavoritesList, FollowsList, ShoppingList
+from .models import (FavoritesList, FollowsList, ShoppingCartTotals,
+                     ShoppingList)
 
 
 class FavoritesListAdmin(admin.ModelAdmin):
@@ -51,6 +52,19 @@ class ShoppingListAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class ShoppingCartTotalsAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'ingredient',
+        'amount',
+    )
+    list_filter = (
+        'user',
+    )
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(FavoritesList, FavoritesListAdmin)
 admin.site.register(FollowsList, FollowsListAdmin)
 admin.site.register(ShoppingList, ShoppingListAdmin)
+admin.site.register(ShoppingCartTotals, ShoppingCartTotalsAdmin)
@@ -1,7 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class SocialConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'social'
     verbose_name = 'Социальные модели'
+
+    def ready(self):
+        from recipes.models import RecipeIngredients
+
+        from .models import ShoppingList
+        from .totals import (cart_item_deleted, cart_item_saved,
+                             recipe_ingredient_changed)
+
+        post_save.connect(cart_item_saved, sender=ShoppingList)
+        post_delete.connect(cart_item_deleted, sender=ShoppingList)
+        post_save.connect(recipe_ingredient_changed, sender=RecipeIngredients)
+        post_delete.connect(
+            recipe_ingredient_changed, sender=RecipeIngredients
+        )
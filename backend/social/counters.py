@@ -0,0 +1,34 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from recipes.models import Recipes
+from users.models import User
+
+from .models import FavoritesList, FollowsList, ShoppingList
+
+COUNTERS = (
+    (Recipes, 'favorites_count', FavoritesList, 'recipe'),
+    (Recipes, 'shopping_count', ShoppingList, 'recipe'),
+    (User, 'followers_count', FollowsList, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Изменение счетчика в базе без чтения текущего значения"""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def counted(relation_model, relation):
+    """Число связей для каждой записи из внешнего запроса"""
+    return Coalesce(
+        Subquery(
+            relation_model.objects.filter(
+                **{relation: OuterRef('pk')}
+            ).order_by().values(relation).annotate(
+                total=Count('id')
+            ).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from recipes.models import Recipes
+from users.models import User
+
+from .models import FollowsList, Timeline
+
+
+def is_popular(author):
+    """Автор, рецепты которого не раскладываются по лентам подписчиков"""
+    return User.objects.filter(
+        pk=author.pk, followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).exists()
+
+
+def fan_out_recipe(recipe):
+    """Запись нового рецепта в ленты подписчиков автора"""
+    if is_popular(recipe.author):
+        return
+    Timeline.objects.bulk_create([
+        Timeline(user_id=user_id, recipe=recipe)
+        for user_id in FollowsList.objects.filter(
+            author=recipe.author
+        ).values_list('user_id', flat=True)
+    ], ignore_conflicts=True)
+
+
+def follow_author(user, author):
+    """Заполнение ленты рецептами автора после подписки"""
+    if is_popular(author):
+        return
+    Timeline.objects.bulk_create([
+        Timeline(user=user, recipe_id=recipe_id)
+        for recipe_id in Recipes.objects.filter(
+            author=author
+        ).values_list('id', flat=True)
+    ], ignore_conflicts=True)
+
+
+def unfollow_author(user, author):
+    """
+    Удаление рецептов автора из ленты после отписки. Если после отписки
+    у автора ровно FEED_FANOUT_LIMIT подписчиков, он перестал быть
+    популярным, и его рецепты, которые читались при запросе,
+    раскладываются по лентам подписчиков. Обратный переход не требует
+    записи: рецепты популярного автора читаются при запросе.
+    """
+    Timeline.objects.filter(user=user, recipe__author=author).delete()
+    insert_timelines(
+        'WHERE f.author_id = %s AND u.followers_count = %s',
+        [author.pk, settings.FEED_FANOUT_LIMIT],
+    )
+
+
+def feed_filter(user):
+    """
+    Условие для ленты пользователя: рецепты из его ленты
+    и рецепты популярных авторов, которые читаются при запросе.
+    """
+    popular = FollowsList.objects.filter(
+        user=user,
+        author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values('author')
+    return (
+        Q(id__in=Timeline.objects.filter(user=user).values('recipe'))
+        | Q(author__in=popular)
+    )
+
+
+def insert_timelines(condition, params):
+    """Запись рецептов авторов в ленты подписчиков одним INSERT ... SELECT"""
+    timeline = Timeline._meta.db_table
+    follows = FollowsList._meta.db_table
+    recipes = Recipes._meta.db_table
+    users = User._meta.db_table
+    with connections[router.db_for_write(Timeline)].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {timeline} (user_id, recipe_id) '
+            f'SELECT f.user_id, r.id FROM {follows} f '
+            f'JOIN {recipes} r ON r.author_id = f.author_id '
+            f'JOIN {users} u ON u.id = f.author_id '
+            f'{condition} '
+            'ON CONFLICT DO NOTHING',
+            params,
+        )
+
+
+def rebuild_timelines():
+    """
+    Заполнение лент по всем подпискам, без рецептов популярных авторов.
+    Для загрузки больших объемов данных.
+    """
+    insert_timelines(
+        'WHERE u.followers_count <= %s', [settings.FEED_FANOUT_LIMIT]
+    )
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from social.models import ShoppingCartTotals
+from social.totals import calculate_cart_totals
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ' Пересобрать или проверить сводные списки покупок '
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить таблицу с расчетом по спискам покупок',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild()
+
+    def rebuild(self):
+        with transaction.atomic():
+            ShoppingCartTotals.objects.all().delete()
+            batch = []
+            for row in calculate_cart_totals().iterator():
+                batch.append(ShoppingCartTotals(
+                    user_id=row['recipe__shopping__user'],
+                    ingredient_id=row['ingredient'],
+                    amount=row['total'],
+                ))
+                if len(batch) >= BATCH_SIZE:
+                    ShoppingCartTotals.objects.bulk_create(batch)
+                    batch = []
+            ShoppingCartTotals.objects.bulk_create(batch)
+        self.stdout.write(self.style.SUCCESS('Сводные списки пересобраны'))
+
+    def verify(self):
+        expected = {
+            (row['recipe__shopping__user'], row['ingredient']): row['total']
+            for row in calculate_cart_totals().iterator()
+        }
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartTotals.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ).iterator()
+        }
+        mismatches = [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for user_id, ingredient_id in mismatches[:20]:
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'ожидается {expected.get((user_id, ingredient_id))}, '
+                f'в таблице {actual.get((user_id, ingredient_id))}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from social.counters import COUNTERS, counted
+
+
+class Command(BaseCommand):
+    help = ' Пересчитать или проверить счетчики популярности '
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить счетчики с числом связей',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        if options['verify']:
+            self.verify()
+        else:
+            self.reconcile()
+
+    def reconcile(self):
+        with transaction.atomic():
+            for model, field, relation_model, relation in COUNTERS:
+                model.objects.update(
+                    **{field: counted(relation_model, relation)}
+                )
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
+
+    def verify(self):
+        mismatches = 0
+        for model, field, relation_model, relation in COUNTERS:
+            rows = model.objects.annotate(
+                expected=counted(relation_model, relation)
+            ).exclude(
+                expected=F(field)
+            ).values_list('pk', field, 'expected')
+            for pk, actual, expected in rows.iterator():
+                mismatches += 1
+                if mismatches <= 20:
+                    self.stdout.write(
+                        f'{model._meta.verbose_name} {pk}, {field}: '
+                        f'ожидается {expected}, в таблице {actual}'
+                    )
+        if mismatches:
+            raise CommandError(f'Расхождений: {mismatches}')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет'))
@@ -1,7 +1,7 @@
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import CheckConstraint, F, Q, UniqueConstraint
-from recipes.models import Recipes
+from recipes.models import Ingredients, Recipes
 from users.models import User
 
 
@@ -91,3 +91,58 @@ class ShoppingList(models.Model):
         ]
         verbose_name = 'Покупка'
         verbose_name_plural = 'Покупки'
+
+
+class ShoppingCartTotals(models.Model):
+    """Модель сводного списка покупок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredients,
+        on_delete=models.CASCADE,
+        related_name='shopping_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество ингредиента',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_totals'
+            )
+        ]
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+
+
+class Timeline(models.Model):
+    """Модель ленты рецептов авторов, на которых подписан пользователь"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Рецепт',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline'
+            )
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента'
@@ -0,0 +1,164 @@
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from recipes.models import RecipeIngredients
+from users.models import User
+
+from .models import ShoppingCartTotals, ShoppingList
+
+# Пользователи, сводные списки которых пересчитываются после фиксации
+pending = threading.local()
+
+
+def recipe_amounts(recipe, sign=1):
+    """Количества ингредиентов рецепта: {ingredient_id: amount}"""
+    return {
+        ingredient_id: sign * amount
+        for ingredient_id, amount in RecipeIngredients.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount')
+    }
+
+
+def amounts_difference(old, new):
+    """Разница количеств ингредиентов после изменения рецепта"""
+    return {
+        ingredient_id: new.get(ingredient_id, 0) - old.get(ingredient_id, 0)
+        for ingredient_id in old.keys() | new.keys()
+    }
+
+
+def update_cart_totals(user_ids, amounts):
+    """
+    Изменение сводных списков покупок пользователей user_ids
+    на количества ингредиентов amounts ({ingredient_id: amount}).
+    """
+    amounts = {
+        ingredient_id: amount
+        for ingredient_id, amount in amounts.items() if amount
+    }
+    user_ids = list(user_ids)
+    if not amounts or not user_ids:
+        return
+    totals = ShoppingCartTotals.objects.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        lock_users(user_ids)
+        existing = set(totals.filter(
+            ingredient_id__in=amounts
+        ).values_list('user_id', 'ingredient_id'))
+        totals.filter(ingredient_id__in=amounts).update(
+            amount=F('amount') + Case(
+                *[
+                    When(ingredient_id=ingredient_id, then=Value(amount))
+                    for ingredient_id, amount in amounts.items()
+                ],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        ShoppingCartTotals.objects.bulk_create([
+            ShoppingCartTotals(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items()
+            if amount > 0 and (user_id, ingredient_id) not in existing
+        ])
+        totals.filter(amount__lte=0).delete()
+
+
+def lock_users(user_ids):
+    """
+    Блокировка пользователей на время изменения их сводных списков:
+    параллельные изменения одного списка выполняются по очереди.
+    """
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk', flat=True))
+
+
+def rebuild_cart_totals(user_ids):
+    """Пересчет сводных списков пользователей по их спискам покупок"""
+    with transaction.atomic():
+        lock_users(user_ids)
+        ShoppingCartTotals.objects.filter(user_id__in=user_ids).delete()
+        ShoppingCartTotals.objects.bulk_create([
+            ShoppingCartTotals(
+                user_id=row['recipe__shopping__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['total'],
+            )
+            for row in calculate_cart_totals(user_ids)
+        ])
+
+
+def rebuild_pending_totals():
+    user_ids = pending.__dict__.pop('user_ids', set())
+    recipe_ids = pending.__dict__.pop('recipe_ids', None)
+    if recipe_ids:
+        user_ids.update(ShoppingList.objects.using(DEFAULT_DB_ALIAS).filter(
+            recipe_id__in=recipe_ids
+        ).values_list('user_id', flat=True))
+    if user_ids:
+        rebuild_cart_totals(user_ids)
+
+
+def schedule_rebuild(name, value):
+    """Пересчет после фиксации транзакции, один раз на все изменения"""
+    pending.__dict__.setdefault(name, set()).add(value)
+    transaction.on_commit(rebuild_pending_totals)
+
+
+def cart_item_saved(sender, instance, created, **kwargs):
+    """
+    Обработчик добавления рецепта в список покупок из API, админки
+    или кода. Количества рецепта добавляются в той же транзакции.
+    """
+    if created:
+        update_cart_totals(
+            [instance.user_id], recipe_amounts(instance.recipe_id)
+        )
+    else:
+        schedule_rebuild('user_ids', instance.user_id)
+
+
+def cart_item_deleted(sender, instance, **kwargs):
+    """
+    Обработчик удаления рецепта из списка покупок, в том числе
+    каскадного при удалении рецепта или автора. Сводный список
+    пользователя пересчитывается один раз после фиксации транзакции.
+    """
+    schedule_rebuild('user_ids', instance.user_id)
+
+
+def recipe_ingredients_changed(recipe_id):
+    """
+    Пересчет сводных списков пользователей, у которых рецепт
+    в списке покупок, после изменения его ингредиентов.
+    """
+    schedule_rebuild('recipe_ids', recipe_id)
+
+
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """
+    Обработчик сохранения и удаления ингредиента рецепта, например
+    в админке. Массовые изменения из API сигналов не отправляют
+    и вызывают recipe_ingredients_changed сами.
+    """
+    recipe_ingredients_changed(instance.recipe_id)
+
+
+def calculate_cart_totals(user_ids=None):
+    """
+    Расчет сводных списков покупок по спискам покупок
+    всех пользователей или пользователей user_ids.
+    """
+    conditions = {'recipe__shopping__isnull': False}
+    if user_ids is not None:
+        conditions = {'recipe__shopping__user__in': user_ids}
+    return RecipeIngredients.objects.filter(
+        **conditions
+    ).order_by().values(
+        'recipe__shopping__user', 'ingredient'
+    ).annotate(total=Sum('amount'))
@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+from foodgram.settings import *  # noqa: F401,F403
+from foodgram.settings import BASE_DIR
+
+# Основная база и реплика - отдельные файлы SQLite, поэтому по данным
+# в ответе видно, из какой базы они прочитаны. Таблицы в реплике
+# создают сами тесты: миграции для реплик не выполняются.
+DATABASES = {
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'{alias}.sqlite3'),
+        'TEST': {
+            'NAME': os.path.join(
+                tempfile.gettempdir(), f'foodgram_test_{alias}.sqlite3'
+            ),
+        },
+    }
+    for alias in ('default', 'replica1')
+}
+DATABASE_REPLICAS = ['replica1']
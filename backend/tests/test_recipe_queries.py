@@ -0,0 +1,95 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredients, RecipeIngredients, Recipes, Tags
+from rest_framework.test import APIClient
+from social.models import FavoritesList, FollowsList, ShoppingList
+from users.models import User
+
+AUTHORS = 10
+RECIPES = 100
+LIMITS = (6, 24, 96)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class RecipeListQueriesTest(TestCase):
+    """Число SQL-запросов списка рецептов не зависит от размера страницы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # bulk_create в SQLite не возвращает id, поэтому записи,
+        # на которые ссылаются другие, создаются по одной
+        authors = [
+            User.objects.create(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+            )
+            for number in range(AUTHORS)
+        ]
+        tags = [
+            Tags.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}',
+            )
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredients.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        recipes = [
+            Recipes.objects.create(
+                author=authors[number % AUTHORS],
+                name=f'Рецепт {number}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            for number in range(RECIPES)
+        ]
+        Recipes.tags.through.objects.bulk_create([
+            Recipes.tags.through(recipes_id=recipe.id, tags_id=tag.id)
+            for recipe in recipes
+            for tag in tags[:2]
+        ])
+        RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes
+            for ingredient in ingredients[:3]
+        ])
+        cls.viewer = User.objects.create(
+            username='viewer', email='viewer@example.com'
+        )
+        FavoritesList.objects.bulk_create([
+            FavoritesList(user=cls.viewer, recipe=recipe)
+            for recipe in recipes[::3]
+        ])
+        ShoppingList.objects.bulk_create([
+            ShoppingList(user=cls.viewer, recipe=recipe)
+            for recipe in recipes[::4]
+        ])
+        FollowsList.objects.bulk_create([
+            FollowsList(user=cls.viewer, author=author)
+            for author in authors[::2]
+        ])
+
+    def assert_constant_queries(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/api/recipes/?limit={LIMITS[0]}')
+        self.assertEqual(len(response.data['results']), LIMITS[0])
+        for limit in LIMITS[1:]:
+            with self.subTest(limit=limit), self.assertNumQueries(
+                len(queries)
+            ):
+                response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(APIClient())
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        self.assert_constant_queries(client)
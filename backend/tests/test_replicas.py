@@ -0,0 +1,107 @@
+import time
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import TransactionTestCase, override_settings
+from foodgram.db.replicas import ReplicaRouter, primary_reads, read_database
+from recipes.models import Tags
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Маршрутизация чтения между основной базой и репликой.
+    Транзакция TestCase направляла бы все чтение в основную базу,
+    поэтому тесты выполняются без нее.
+    """
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        cache.clear()
+        with connections['replica1'].schema_editor() as editor:
+            editor.create_model(Tags)
+        self.primary_tag = Tags.objects.using('default').create(
+            name='Основная', color='#000001', slug='primary'
+        )
+        # Разные id, чтобы запрос по id находил запись только в одной базе
+        self.replica_tag = Tags.objects.using('replica1').create(
+            id=self.primary_tag.id + 1000,
+            name='Реплика', color='#000002', slug='replica',
+        )
+        user = User.objects.create_user(
+            username='writer', email='writer@example.com', password='pass'
+        )
+        self.writer = APIClient()
+        self.writer.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}'
+        )
+
+    def tearDown(self):
+        with connections['replica1'].schema_editor() as editor:
+            editor.delete_model(Tags)
+
+    def found(self, client, tag):
+        return client.get(f'/api/tags/{tag.id}/').status_code == 200
+
+    def create_tag(self):
+        response = self.writer.post(
+            '/api/tags/', {'name': 'Новый', 'color': '#000003', 'slug': 'new'}
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_safe_methods_read_from_replica(self):
+        client = APIClient()
+        self.assertTrue(self.found(client, self.replica_tag))
+        self.assertFalse(self.found(client, self.primary_tag))
+        self.assertTrue(self.found(self.writer, self.replica_tag))
+
+    def test_writes_go_to_default(self):
+        self.create_tag()
+        self.assertTrue(
+            Tags.objects.using('default').filter(slug='new').exists()
+        )
+        self.assertFalse(
+            Tags.objects.using('replica1').filter(slug='new').exists()
+        )
+
+    @override_settings(REPLICA_STICKY_SECONDS=1)
+    def test_client_reads_from_default_after_write(self):
+        self.create_tag()
+        self.assertTrue(self.found(self.writer, self.primary_tag))
+        self.assertFalse(self.found(APIClient(), self.primary_tag))
+        time.sleep(1.1)
+        self.assertFalse(self.found(self.writer, self.primary_tag))
+
+    def test_failed_write_does_not_stick(self):
+        response = self.writer.post('/api/tags/', {'name': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.found(self.writer, self.primary_tag))
+
+    def test_reads_inside_atomic_go_to_default(self):
+        router = ReplicaRouter()
+        token = read_database.set('replica1')
+        try:
+            self.assertEqual(router.db_for_read(Tags), 'replica1')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Tags), 'default')
+                self.assertTrue(
+                    Tags.objects.filter(pk=self.primary_tag.pk).exists()
+                )
+        finally:
+            read_database.reset(token)
+
+    def test_primary_reads(self):
+        token = read_database.set('replica1')
+        try:
+            self.assertFalse(
+                Tags.objects.filter(pk=self.primary_tag.pk).exists()
+            )
+            with primary_reads():
+                self.assertTrue(
+                    Tags.objects.filter(pk=self.primary_tag.pk).exists()
+                )
+            self.assertEqual(read_database.get(), 'replica1')
+        finally:
+            read_database.reset(token)
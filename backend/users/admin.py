@@ -10,6 +10,7 @@ class UsersAdmin(UserAdmin):
         'email',
         'first_name',
         'last_name',
+        'followers_count',
     )
     search_fields = (
         'username',
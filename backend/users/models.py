@@ -21,6 +21,11 @@ class User(AbstractUser):
         max_length=30,
         verbose_name='Фамилия',
     )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
 
     class Meta:
         ordering = ('username',)